@@ -0,0 +1,107 @@
+"""
+Tree reduction of BLS public keys and signatures, with the leaves computed on worker processes
+"""
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence, Tuple
+
+from eth_typing import BLSPubkey, BLSSignature
+from py_ecc.bls.utils import G1_to_pubkey, G2_to_signature, hash_to_G2
+from py_ecc.optimized_bls12_381 import Z1, Z2, add
+
+from keys import FixedBaseTable, get_g1_table
+from memo import Memo
+
+# Number of consecutive signers aggregated by one worker task
+LEAF_SIZE = 128
+
+
+@lru_cache(maxsize=None)
+def get_message_table(message: bytes, domain: int) -> FixedBaseTable:
+    """
+    Fixed-base table of the hash of ``message``, built once per process
+    """
+    return FixedBaseTable.build(hash_to_G2(message, domain), Z2)
+
+
+def sign_leaf(privkeys: Sequence[int],
+              message: bytes,
+              domain: int) -> Tuple[List[BLSPubkey], List[BLSSignature], Any, Any]:
+    """
+    Return the public keys and the signatures of ``message`` of ``privkeys``, with their sums
+    as G1 and G2 points
+    """
+    g1_table = get_g1_table()
+    message_table = get_message_table(message, domain)
+    pubkeys = []
+    signatures = []
+    pubkey_sum = Z1
+    signature_sum = Z2
+    for privkey in privkeys:
+        pubkey_point = g1_table.multiply(privkey)
+        signature_point = message_table.multiply(privkey)
+        pubkeys.append(G1_to_pubkey(pubkey_point))
+        signatures.append(G2_to_signature(signature_point))
+        pubkey_sum = add(pubkey_sum, pubkey_point)
+        signature_sum = add(signature_sum, signature_point)
+    return pubkeys, signatures, pubkey_sum, signature_sum
+
+
+signed_leaves = Memo(sign_leaf)
+
+
+def tree_reduce(leaves: Sequence[Any]) -> List[Any]:
+    """
+    Add ``leaves`` pairwise, level by level, up to their total.
+    Return the leftmost node of every level, i.e. the sums of the first 1, 2, 4... leaves.
+    """
+    level = list(leaves)
+    if not level:
+        raise ValueError("Cannot reduce an empty list of leaves")
+    checkpoints = [level[0]]
+    while len(level) > 1:
+        level = [
+            add(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+            for i in range(0, len(level), 2)
+        ]
+        checkpoints.append(level[0])
+    return checkpoints
+
+
+def get_checkpoint_counts(signer_count: int) -> List[int]:
+    """
+    Return the number of signers aggregated by every checkpoint of ``tree_reduce``
+    """
+    counts = []
+    count = LEAF_SIZE
+    while count < signer_count:
+        counts.append(count)
+        count *= 2
+    return counts + [signer_count]
+
+
+def aggregate_signers(privkeys: Sequence[int],
+                      message: bytes,
+                      domain: int,
+                      workers: Optional[int] = None,
+                      ) -> Tuple[List[BLSPubkey], List[BLSSignature], List[Tuple[int, BLSPubkey, BLSSignature]]]:
+    """
+    Sign ``message`` with all ``privkeys``, every ``LEAF_SIZE`` signers on one of ``workers``
+    processes, and tree-reduce the public keys and signatures of the leaves.
+    Return the public keys, the signatures and the ``(count, aggregate_pubkey, aggregate_signature)``
+    of the first ``count`` signers at every checkpoint.
+    """
+    arguments = [
+        (tuple(privkeys[i:i + LEAF_SIZE]), message, domain)
+        for i in range(0, len(privkeys), LEAF_SIZE)
+    ]
+    signed_leaves.compute_all(arguments, workers)
+    leaves = [signed_leaves(*args) for args in arguments]
+    pubkeys = [pubkey for leaf_pubkeys, _, _, _ in leaves for pubkey in leaf_pubkeys]
+    signatures = [signature for _, leaf_signatures, _, _ in leaves for signature in leaf_signatures]
+    pubkey_checkpoints = tree_reduce([pubkey_sum for _, _, pubkey_sum, _ in leaves])
+    signature_checkpoints = tree_reduce([signature_sum for _, _, _, signature_sum in leaves])
+    return pubkeys, signatures, [
+        (count, G1_to_pubkey(pubkey_sum), G2_to_signature(signature_sum))
+        for count, pubkey_sum, signature_sum in zip(
+            get_checkpoint_counts(len(privkeys)), pubkey_checkpoints, signature_checkpoints)
+    ]
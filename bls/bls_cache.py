@@ -0,0 +1,195 @@
+"""
+Persistent on-disk cache of the results of expensive BLS operations
+"""
+import hashlib
+import os
+import tempfile
+from typing import Any, Iterable, List, Optional, Tuple
+
+from py_ecc.optimized_bls12_381 import FQ, FQ2
+
+from gen_helpers.checkpoint import source_digest
+
+BLS_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BLS_DIR, '.bls_cache')
+MAX_CACHE_BYTES = 2**28  # 256 MiB
+
+# Bump when the encoding of cached values changes
+CACHE_VERSION = 1
+
+# Modules of this repository that compute cached results (fixed-base table, multi-Miller loop,
+# leaf signatures...), their digest is part of every key so that a fix to any of them is never
+# served stale results
+SOURCE_FILES = [
+    os.path.join(BLS_DIR, name)
+    for name in ('bls_cache.py', 'memo.py', 'keys.py', 'verification.py', 'aggregation.py')
+]
+
+ENTRY_SUFFIX = '.entry'
+
+
+def get_py_ecc_version() -> str:
+    try:
+        from importlib.metadata import version
+    except ImportError:  # Python < 3.8
+        import pkg_resources
+        return pkg_resources.get_distribution('py_ecc').version
+    return version('py_ecc')
+
+
+def encode(value: Any) -> bytes:
+    """
+    Deterministic serialization of the inputs and results of BLS operations: bytes, booleans,
+    integers, FQ and FQ2 elements, and sequences of them
+    """
+    if isinstance(value, bytes):
+        return b'B' + len(value).to_bytes(4, 'big') + value
+    if isinstance(value, bool):
+        return b'T' if value else b'F'
+    if isinstance(value, int):
+        data = value.to_bytes((value.bit_length() + 8) // 8, 'big', signed=True)
+        return b'I' + len(data).to_bytes(4, 'big') + data
+    if isinstance(value, FQ):
+        return b'Q' + encode(value.n)
+    if isinstance(value, FQ2):
+        return b'R' + encode(tuple(value.coeffs))
+    if isinstance(value, (tuple, list)):
+        return b'S' + len(value).to_bytes(4, 'big') + b''.join(encode(item) for item in value)
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def decode_from(data: bytes, offset: int) -> Tuple[Any, int]:
+    tag = data[offset:offset + 1]
+    offset += 1
+    if tag == b'T':
+        return True, offset
+    if tag == b'F':
+        return False, offset
+    if tag == b'Q':
+        n, offset = decode_from(data, offset)
+        return FQ(n), offset
+    if tag == b'R':
+        coeffs, offset = decode_from(data, offset)
+        return FQ2(coeffs), offset
+
+    length = int.from_bytes(data[offset:offset + 4], 'big')
+    offset += 4
+    if tag == b'B':
+        return data[offset:offset + length], offset + length
+    if tag == b'I':
+        return int.from_bytes(data[offset:offset + length], 'big', signed=True), offset + length
+    if tag == b'S':
+        items = []
+        for _ in range(length):
+            item, offset = decode_from(data, offset)
+            items.append(item)
+        return tuple(items), offset
+    raise ValueError(f"Unknown tag {tag!r}")
+
+
+def decode(data: bytes) -> Any:
+    """
+    Inverse of ``encode``, sequences are decoded as tuples
+    """
+    value, offset = decode_from(data, 0)
+    if offset != len(data):
+        raise ValueError("Trailing data")
+    return value
+
+
+class BLSCache:
+    """
+    An on-disk cache of the results of BLS operations.
+
+    Entries are keyed by a digest of the operation name, its encoded arguments, the py_ecc
+    version and the source of the modules that compute them, and stored as one file per entry.
+    Reads refresh the modification time of an entry, and the least recently used entries are
+    evicted once the cache exceeds ``max_bytes``. The size of the cache is counted from one
+    scan of the directory, so that stores do not scan it again until the count exceeds
+    ``max_bytes``. Entries are written atomically, so the cache can be shared by concurrent
+    processes.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.py_ecc_version = get_py_ecc_version()
+        self.source_digest = source_digest(SOURCE_FILES)
+        self.total_bytes: Optional[int] = None
+
+    def get_key(self, operation: str, encoded_args: bytes) -> str:
+        digest = hashlib.sha256()
+        digest.update(encode((
+            CACHE_VERSION,
+            self.py_ecc_version.encode(),
+            self.source_digest.encode(),
+            operation.encode(),
+        )))
+        digest.update(encoded_args)
+        return digest.hexdigest()
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Return the encoded result stored under ``key``, or ``None`` on a miss.
+        """
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def set_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        """
+        Store every encoded result under its key, then evict old entries if needed.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        written_bytes = 0
+        for key, data in items:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.get_path(key))
+            written_bytes += len(data)
+        if self.total_bytes is None:
+            self.total_bytes = sum(size for _, size, _ in self.scan())
+        else:
+            self.total_bytes += written_bytes
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def scan(self) -> List[Tuple[float, int, str]]:
+        """
+        Return the modification time, size and path of every entry.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(ENTRY_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self) -> None:
+        """
+        Delete the least recently used entries until the cache fits into ``max_bytes``.
+        """
+        entries = self.scan()
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+        self.total_bytes = total_bytes
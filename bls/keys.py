@@ -0,0 +1,168 @@
+"""
+Deterministic private keys of the generated signers, and their public keys computed with a
+fixed-base table of the G1 generator
+"""
+import hashlib
+import os
+import tempfile
+from typing import Any, List, Optional
+
+from eth_typing import BLSPubkey
+from eth_utils import big_endian_to_int
+from py_ecc.bls.utils import G1_to_pubkey
+from py_ecc.optimized_bls12_381 import FQ, G1, Z1, add, curve_order, eq, multiply
+
+# Bits of a scalar handled by every window of a fixed-base table
+WINDOW_BITS = 8
+WINDOW_COUNT = -(-curve_order.bit_length() // WINDOW_BITS)
+
+# Bump when the file format of persisted tables changes
+TABLE_VERSION = 1
+
+FQ_BYTES = 48
+TABLE_BYTES = WINDOW_COUNT * 2**WINDOW_BITS * 3 * FQ_BYTES
+
+# (window, digit) entries of a persisted table checked against ``multiply`` when it is loaded
+SPOT_CHECKS = [
+    (0, 1),
+    (0, 2**WINDOW_BITS - 1),
+    (WINDOW_COUNT // 2, 0x5a),
+    (WINDOW_COUNT - 1, 1),
+    (WINDOW_COUNT - 1, 2**WINDOW_BITS - 1),
+]
+
+
+class FixedBaseTable:
+    """
+    The multiples ``digit * 2**(WINDOW_BITS * window) * base`` of a fixed point ``base``, for
+    every window of a scalar modulo the curve order and every digit of a window.
+
+    A scalar multiplication of ``base`` is then one point addition per window, instead of a
+    doubling per bit and an addition per set bit.
+    """
+
+    def __init__(self, windows: List[List[Any]]) -> None:
+        self.windows = windows
+
+    @classmethod
+    def build(cls, base: Any, zero: Any) -> 'FixedBaseTable':
+        windows = []
+        for _ in range(WINDOW_COUNT):
+            window = [zero]
+            for _ in range(2**WINDOW_BITS - 1):
+                window.append(add(window[-1], base))
+            windows.append(window)
+            base = add(window[-1], base)
+        return cls(windows)
+
+    def multiply(self, scalar: int) -> Any:
+        """
+        Same point as ``multiply(base, scalar)``
+        """
+        scalar %= curve_order
+        result = self.windows[0][0]
+        mask = 2**WINDOW_BITS - 1
+        for window in self.windows:
+            digit = scalar & mask
+            if digit:
+                result = add(result, window[digit])
+            scalar >>= WINDOW_BITS
+        return result
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize a table of G1 points as the big-endian coordinates of every point
+        """
+        return b''.join(
+            coordinate.n.to_bytes(FQ_BYTES, 'big')
+            for window in self.windows
+            for point in window
+            for coordinate in point
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'FixedBaseTable':
+        """
+        Deserialize a table of G1 points written by ``to_bytes``
+        """
+        if len(data) != TABLE_BYTES:
+            raise ValueError(f"Expected a table of {TABLE_BYTES} bytes, got {len(data)}")
+        coordinates = [
+            FQ(big_endian_to_int(data[i:i + FQ_BYTES]))
+            for i in range(0, len(data), FQ_BYTES)
+        ]
+        points = [tuple(coordinates[i:i + 3]) for i in range(0, len(coordinates), 3)]
+        window_size = 2**WINDOW_BITS
+        return cls([points[i:i + window_size] for i in range(0, len(points), window_size)])
+
+    def check(self, base: Any) -> bool:
+        """
+        Return whether the ``SPOT_CHECKS`` entries are the multiples of ``base`` they should be
+        """
+        return all(
+            eq(self.windows[window][digit], multiply(base, digit << (WINDOW_BITS * window)))
+            for window, digit in SPOT_CHECKS
+        )
+
+
+def get_table_path(directory: str) -> str:
+    return os.path.join(directory, f'g1_table_v{TABLE_VERSION}_w{WINDOW_BITS}.bin')
+
+
+def load_g1_table(directory: Optional[str] = None) -> FixedBaseTable:
+    """
+    Return the fixed-base table of the G1 generator, read from ``directory`` if it was persisted
+    there before and passes its checks. Otherwise the table is built, and written to
+    ``directory`` if one is given.
+    """
+    if directory is not None:
+        try:
+            with open(get_table_path(directory), 'rb') as f:
+                table = FixedBaseTable.from_bytes(f.read())
+            if table.check(G1):
+                return table
+        except (FileNotFoundError, ValueError):
+            pass
+
+    table = FixedBaseTable.build(G1, Z1)
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(table.to_bytes())
+        os.replace(tmp_path, get_table_path(directory))
+    return table
+
+
+# Built once per process: by the first ``privtopub`` call, or by ``use_g1_table`` before the
+# worker processes are forked
+g1_table: Optional[FixedBaseTable] = None
+
+
+def use_g1_table(directory: Optional[str] = None) -> None:
+    """
+    Load the fixed-base table of the G1 generator now, from the persisted table in ``directory``
+    if any
+    """
+    global g1_table
+    g1_table = load_g1_table(directory)
+
+
+def get_g1_table() -> FixedBaseTable:
+    if g1_table is None:
+        use_g1_table()
+    return g1_table
+
+
+def privtopub(privkey: int) -> BLSPubkey:
+    """
+    Same as ``bls.privtopub``
+    """
+    return G1_to_pubkey(get_g1_table().multiply(privkey))
+
+
+def derive_privkey(index: int) -> int:
+    """
+    Deterministic private key of the signer ``index``
+    """
+    return big_endian_to_int(hashlib.sha256(b'committee' + index.to_bytes(8, 'little')).digest()) % curve_order
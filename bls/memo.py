@@ -0,0 +1,116 @@
+"""
+Memoized BLS operations, so that every expensive curve operation runs once per generator run,
+and once across runs with a persistent cache
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from eth_typing import BLSSignature
+from py_ecc import bls
+from py_ecc.optimized_bls12_381 import multiply
+
+from bls_cache import BLSCache, decode, encode
+from gen_helpers.parallel import map_cases
+import keys
+import verification
+
+# Persistent cache shared by all memos, see ``use_cache``
+cache: Optional[BLSCache] = None
+
+
+def use_cache(bls_cache: Optional[BLSCache]) -> None:
+    global cache
+    cache = bls_cache
+
+
+class Memo:
+    """
+    Caches the results of ``function`` by its encoded arguments, in memory and in the
+    persistent cache if any
+    """
+
+    def __init__(self, function: Callable[..., Any], name: Optional[str] = None) -> None:
+        self.function = function
+        self.name = name or function.__name__
+        self.results: Dict[bytes, Any] = {}
+
+    def load(self, encoded_args: bytes) -> bool:
+        """
+        Return whether the result of ``encoded_args`` is known, reading it from the persistent
+        cache if needed
+        """
+        if encoded_args in self.results:
+            return True
+        if cache is None:
+            return False
+        data = cache.get(cache.get_key(self.name, encoded_args))
+        if data is None:
+            return False
+        self.results[encoded_args] = decode(data)
+        return True
+
+    def store(self, results: Iterable[Tuple[bytes, Any]]) -> None:
+        results = list(results)
+        self.results.update(results)
+        if cache is not None:
+            cache.set_many(
+                (cache.get_key(self.name, encoded_args), encode(result))
+                for encoded_args, result in results
+            )
+
+    def __call__(self, *args: Any) -> Any:
+        encoded_args = encode(args)
+        if not self.load(encoded_args):
+            self.store([(encoded_args, self.function(*args))])
+        return self.results[encoded_args]
+
+    def missing(self, arguments: Iterable[Sequence[Any]]) -> List[Tuple[Any, ...]]:
+        unique = {encode(tuple(args)): tuple(args) for args in arguments}
+        return [args for encoded_args, args in unique.items() if not self.load(encoded_args)]
+
+    def compute_all(self, arguments: Iterable[Sequence[Any]], workers: Optional[int] = None) -> None:
+        """
+        Compute the results of all ``arguments`` that are not cached yet, on ``workers`` processes.
+        """
+        missing = self.missing(arguments)
+        self.store(zip(map(encode, missing), map_cases(self.function, missing, workers)))
+
+
+def sign_message_point(message_point: Any, privkey: int) -> BLSSignature:
+    """
+    Same as ``bls.sign``, for a message already hashed to G2
+    """
+    return bls.utils.G2_to_signature(multiply(message_point, privkey))
+
+
+class SignatureMemo(Memo):
+    """
+    Caches ``bls.sign(message, privkey, domain)`` by its arguments, reusing the memoized
+    message hashes
+    """
+
+    def __init__(self) -> None:
+        super().__init__(self.sign, 'sign')
+
+    @staticmethod
+    def sign(message: bytes, privkey: int, domain: int) -> BLSSignature:
+        return sign_message_point(hash_to_G2(message, domain), privkey)
+
+    def compute_all(self, arguments: Iterable[Sequence[Any]], workers: Optional[int] = None) -> None:
+        missing = self.missing(arguments)
+        hash_to_G2.compute_all([(message, domain) for message, _, domain in missing], workers)
+        tasks = [(hash_to_G2(message, domain), privkey) for message, privkey, domain in missing]
+        self.store(zip(map(encode, missing), map_cases(sign_message_point, tasks, workers)))
+
+
+def hash_to_G2_compressed(message: bytes, domain: int) -> Tuple[int, int]:
+    return bls.utils.compress_G2(hash_to_G2(message, domain))
+
+
+hash_to_G2 = Memo(bls.utils.hash_to_G2)
+compress_G2 = Memo(hash_to_G2_compressed, 'compress_G2')
+privtopub = Memo(keys.privtopub)
+sign = SignatureMemo()
+aggregate_signatures = Memo(bls.aggregate_signatures)
+aggregate_pubkeys = Memo(bls.aggregate_pubkeys)
+verify_message_point = Memo(verification.verify_message_point)
+aggregate_verify = Memo(verification.aggregate_verify)
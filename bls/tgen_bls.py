@@ -2,20 +2,36 @@
 BLS test vectors generator
 Usage:
     "python tgen_bls path/to/output.yml"
+An interrupted run resumes after the last section it completed, see ``--restart``.
 """
 
 # Standard library
+import argparse
+import os
 import sys
-from typing import Tuple
-
-# Third-party
-import yaml
+from typing import Sequence, Tuple
 
 # Ethereum
-from eth_utils import int_to_big_endian, big_endian_to_int
+from eth_typing import BLSSignature
+from eth_utils import int_to_big_endian, big_endian_to_int, keccak
 
 # Local imports
 from py_ecc import bls
+from py_ecc.optimized_bls12_381 import curve_order
+
+# Shared generator helpers live at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import bls_cache  # noqa: E402
+import keys  # noqa: E402
+import memo  # noqa: E402
+import verification  # noqa: E402
+from bls_cache import CACHE_DIR, BLSCache  # noqa: E402
+from gen_helpers.checkpoint import CheckpointedOutput, source_digest  # noqa: E402
+from gen_helpers.compression import COMPRESSIONS  # noqa: E402
+from gen_helpers.output import open_output  # noqa: E402
+from gen_helpers import yaml_emit  # noqa: E402
+from gen_helpers.yaml_emit import PyYAMLLibrary, YAMLEmitter  # noqa: E402
+from keys import derive_privkey, use_g1_table  # noqa: E402
 
 
 def int_to_hex(n: int) -> str:
@@ -51,6 +67,11 @@ PRIVKEYS = [
     hex_to_int('0x00000000000000000000000000000000328388aff0d4a5b7dc9205abd374e7e98f3cd9f3418edb4eafda5fb16473d216'),
 ]
 
+# Committees of the aggregate verification cases, up to realistic attestation sizes
+COMMITTEE_SIZES = [2, 16, 128, 512]
+
+AGGREGATE_VERIFY_DOMAIN = DOMAINS[2]
+
 
 def hash_message(msg: bytes,
                  domain: int) ->Tuple[Tuple[str, str], Tuple[str, str], Tuple[str, str]]:
@@ -67,7 +88,7 @@ def hash_message(msg: bytes,
             int_to_hex(fq2.coeffs[0]),
             int_to_hex(fq2.coeffs[1]),
         ]
-        for fq2 in bls.utils.hash_to_G2(msg, domain)
+        for fq2 in memo.hash_to_G2(msg, domain)
     ]
 
 
@@ -80,113 +101,480 @@ def hash_message_compressed(msg: bytes, domain: int) -> Tuple[str, str]:
     Output:
         - Message hash as a compressed G2 point
     """
-    z1, z2 = bls.utils.compress_G2(bls.utils.hash_to_G2(msg, domain))
+    z1, z2 = memo.compress_G2(msg, domain)
     return [int_to_hex(z1), int_to_hex(z2)]
 
 
-if __name__ == '__main__':
+def make_message_hash_uncompressed_case(msg: bytes, domain: int):
+    return {
+        'input': {'message': '0x' + msg.hex(), 'domain': int_to_hex(domain)},
+        'output': hash_message(msg, domain)
+    }
 
-    # Order not preserved - https://github.com/yaml/pyyaml/issues/110
-    metadata = {
-        'title': 'BLS signature and aggregation tests',
-        'summary': 'Test vectors for BLS signature',
-        'test_suite': 'bls',
-        'fork': 'phase0-0.5.0',
+
+def make_message_hash_compressed_case(msg: bytes, domain: int):
+    return {
+        'input': {'message': '0x' + msg.hex(), 'domain': int_to_hex(domain)},
+        'output': hash_message_compressed(msg, domain)
+    }
+
+
+def make_sign_case(privkey: int, message: bytes, domain: int):
+    sig = memo.sign(message, privkey, domain)
+    return {
+        'input': {
+            'privkey': int_to_hex(privkey),
+            'message': '0x' + message.hex(),
+            'domain': int_to_hex(domain)
+        },
+        'output': '0x' + sig.hex()
     }
 
-    case01_message_hash_G2_uncompressed = []
-    for msg in MESSAGES:
-        for domain in DOMAINS:
-            case01_message_hash_G2_uncompressed.append({
-                'input': {'message': '0x' + msg.hex(), 'domain': int_to_hex(domain)},
-                'output': hash_message(msg, domain)
-            })
-
-    case02_message_hash_G2_compressed = []
-    for msg in MESSAGES:
-        for domain in DOMAINS:
-            case02_message_hash_G2_compressed.append({
-                'input': {'message': '0x' + msg.hex(), 'domain': int_to_hex(domain)},
-                'output': hash_message_compressed(msg, domain)
-            })
-
-    case03_private_to_public_key = []
-    #  Used in later cases
-    pubkeys = [bls.privtopub(privkey) for privkey in PRIVKEYS]
-    #  Used in public key aggregation
-    pubkeys_serial = ['0x' + pubkey.hex() for pubkey in pubkeys]
-    case03_private_to_public_key = [
+
+def get_verify_inputs():
+    """
+    Return the ``(message, domain, pubkey, signature)`` of the signature verification cases:
+    first all signatures of ``make_sign_case``, then signatures checked against the wrong
+    public key and against the wrong message
+    """
+    valid = [
+        (message, domain, memo.privtopub(privkey), memo.sign(message, privkey, domain))
+        for privkey in PRIVKEYS
+        for message in MESSAGES
+        for domain in DOMAINS
+    ]
+    wrong_pubkey = [
+        (message, domain, memo.privtopub(PRIVKEYS[1]), memo.sign(message, PRIVKEYS[0], domain))
+        for message in MESSAGES
+        for domain in DOMAINS
+    ]
+    wrong_message = [
+        (MESSAGES[(i + 1) % len(MESSAGES)], domain, memo.privtopub(PRIVKEYS[0]),
+         memo.sign(message, PRIVKEYS[0], domain))
+        for i, message in enumerate(MESSAGES)
+        for domain in DOMAINS
+    ]
+    return valid, wrong_pubkey + wrong_message
+
+
+def make_verify_case(message: bytes, domain: int, pubkey: bytes, signature: bytes, result: bool):
+    return {
+        'input': {
+            'pubkey': '0x' + pubkey.hex(),
+            'message': '0x' + message.hex(),
+            'signature': '0x' + signature.hex(),
+            'domain': int_to_hex(domain)
+        },
+        'output': result
+    }
+
+
+def make_aggregate_sigs_case(message: bytes, domain: int):
+    sigs = []
+    for privkey in PRIVKEYS:
+        sig = memo.sign(message, privkey, domain)
+        sigs.append(sig)
+    return {
+        'input': ['0x' + sig.hex() for sig in sigs],
+        'output': '0x' + memo.aggregate_signatures(tuple(sigs)).hex(),
+    }
+
+
+def sign_aggregate(message: bytes, privkeys: Sequence[int], domain: int) -> BLSSignature:
+    """
+    Aggregate signature of ``message`` by all ``privkeys``.
+    Signing is linear in the private key, so this is ``bls.aggregate_signatures`` of the
+    individual signatures for the cost of a single one.
+    """
+    return memo.sign(message, sum(privkeys) % curve_order, domain)
+
+
+def get_aggregate_verify_inputs():
+    """
+    Return the ``(messages, domain, pubkeys, signature)`` of the aggregate verification cases,
+    ``pubkeys[i]`` being the signers of ``messages[i]``: for every committee size, one half of
+    the committee signs each message, as attesters do with the two custody bits.
+    First all valid aggregates, then aggregates checked with an extra public key that did not
+    sign and against swapped messages.
+    """
+    messages = MESSAGES[1:]
+    domain = AGGREGATE_VERIFY_DOMAIN
+    privkeys = [derive_privkey(index) for index in range(max(COMMITTEE_SIZES) + 1)]
+    valid = []
+    invalid = []
+    for size in COMMITTEE_SIZES:
+        groups = [privkeys[:size // 2], privkeys[size // 2:size]]
+        signature = bls.aggregate_signatures([
+            sign_aggregate(message, group, domain)
+            for message, group in zip(messages, groups)
+        ])
+        pubkeys = [[memo.privtopub(privkey) for privkey in group] for group in groups]
+        valid.append((messages, domain, pubkeys, signature))
+        non_signer = memo.privtopub(privkeys[size])
+        invalid.append((messages, domain, [pubkeys[0], pubkeys[1] + [non_signer]], signature))
+        invalid.append((messages[::-1], domain, pubkeys, signature))
+    return valid, invalid
+
+
+def make_aggregate_verify_case(messages: Sequence[bytes],
+                               domain: int,
+                               pubkeys: Sequence[Sequence[bytes]],
+                               signature: bytes,
+                               result: bool):
+    return {
+        'input': {
+            'pubkeys': [['0x' + pubkey.hex() for pubkey in group] for group in pubkeys],
+            'messages': ['0x' + message.hex() for message in messages],
+            'signature': '0x' + signature.hex(),
+            'domain': int_to_hex(domain)
+        },
+        'output': result
+    }
+
+
+def proof_of_possession(privkey: int, domain: int) -> BLSSignature:
+    """
+    Signature of the hash of the public key of ``privkey``
+    """
+    return memo.sign(keccak(memo.privtopub(privkey)), privkey, domain)
+
+
+def get_proof_of_possession_inputs():
+    """
+    Return the ``(pubkey, domain, proof_of_possession)`` of the proof-of-possession cases:
+    first the proofs of all private keys, then proofs checked against the wrong public key
+    and the wrong domain
+    """
+    valid = [
+        (memo.privtopub(privkey), domain, proof_of_possession(privkey, domain))
+        for privkey in PRIVKEYS
+        for domain in DOMAINS
+    ]
+    wrong_pubkey = [
+        (memo.privtopub(PRIVKEYS[(i + 1) % len(PRIVKEYS)]), DOMAINS[0], proof_of_possession(privkey, DOMAINS[0]))
+        for i, privkey in enumerate(PRIVKEYS)
+    ]
+    wrong_domain = [
+        (memo.privtopub(privkey), DOMAINS[1], proof_of_possession(privkey, DOMAINS[0]))
+        for privkey in PRIVKEYS
+    ]
+    return valid, wrong_pubkey + wrong_domain
+
+
+def make_proof_of_possession_case(pubkey: bytes, domain: int, proof: bytes, result: bool):
+    return {
+        'input': {
+            'pubkey': '0x' + pubkey.hex(),
+            'proof_of_possession': '0x' + proof.hex(),
+            'domain': int_to_hex(domain)
+        },
+        'output': result
+    }
+
+
+def check_results(results, valid_count, name):
+    """
+    Raise if the ``results`` of the valid inputs followed by the invalid ones are not as expected
+    """
+    if results != [True] * valid_count + [False] * (len(results) - valid_count):
+        raise AssertionError(f"{name} results disagree with the generated inputs")
+
+
+def case01_message_hash_G2_uncompressed(workers=None):
+    return [
+        make_message_hash_uncompressed_case(msg, domain)
+        for msg in MESSAGES
+        for domain in DOMAINS
+    ]
+
+
+def case02_message_hash_G2_compressed(workers=None):
+    return [
+        make_message_hash_compressed_case(msg, domain)
+        for msg in MESSAGES
+        for domain in DOMAINS
+    ]
+
+
+def case03_private_to_public_key(workers=None):
+    return [
         {
             'input': int_to_hex(privkey),
-            'output': pubkey_serial,
+            'output': '0x' + memo.privtopub(privkey).hex(),
         }
-        for privkey, pubkey_serial in zip(PRIVKEYS, pubkeys_serial)
+        for privkey in PRIVKEYS
     ]
 
-    case04_sign_messages = []
-    sigs = []  # used in verify
-    for privkey in PRIVKEYS:
-        for message in MESSAGES:
-            for domain in DOMAINS:
-                sig = bls.sign(message, privkey, domain)
-                case04_sign_messages.append({
-                    'input': {
-                        'privkey': int_to_hex(privkey),
-                        'message': '0x' + message.hex(),
-                        'domain': int_to_hex(domain)
-                    },
-                    'output': '0x' + sig.hex()
-                })
-                sigs.append(sig)
-
-    # TODO: case05_verify_messages: Verify messages signed in case04
-    # It takes too long, empty for now
-
-    case06_aggregate_sigs = []
-    for domain in DOMAINS:
-        for message in MESSAGES:
-            sigs = []
-            for privkey in PRIVKEYS:
-                sig = bls.sign(message, privkey, domain)
-                sigs.append(sig)
-            case06_aggregate_sigs.append({
-                'input': ['0x' + sig.hex() for sig in sigs],
-                'output': '0x' + bls.aggregate_signatures(sigs).hex(),
-            })
-
-    case07_aggregate_pubkeys = [
+
+def case04_sign_messages(workers=None):
+    return [
+        make_sign_case(privkey, message, domain)
+        for privkey in PRIVKEYS
+        for message in MESSAGES
+        for domain in DOMAINS
+    ]
+
+
+def case05_verify_messages(workers=None):
+    valid_verify_inputs, invalid_verify_inputs = get_verify_inputs()
+    verify_inputs = valid_verify_inputs + invalid_verify_inputs
+    # Every recorded output is decided by an individual verification
+    tasks = [
+        (memo.hash_to_G2(message, domain), pubkey, signature)
+        for message, domain, pubkey, signature in verify_inputs
+    ]
+    if memo.verify_message_point.missing(tasks):
+        # Fast path: check all signatures expected to be valid at once, with a single final exponentiation
+        batch_valid = verification.batch_verify(
+            [memo.hash_to_G2(message, domain) for message, domain, _, _ in valid_verify_inputs],
+            [pubkey for _, _, pubkey, _ in valid_verify_inputs],
+            [signature for _, _, _, signature in valid_verify_inputs],
+            workers,
+        )
+        memo.verify_message_point.compute_all(tasks, workers)
+        if batch_valid != all(memo.verify_message_point(*task) for task in tasks[:len(valid_verify_inputs)]):
+            raise AssertionError("Batch verification disagrees with individual verifications")
+    verify_results = [memo.verify_message_point(*task) for task in tasks]
+
+    return [
+        make_verify_case(*verify_input, result)
+        for verify_input, result in zip(verify_inputs, verify_results)
+    ]
+
+
+def case06_aggregate_sigs(workers=None):
+    return [
+        make_aggregate_sigs_case(message, domain)
+        for domain in DOMAINS
+        for message in MESSAGES
+    ]
+
+
+def case07_aggregate_pubkeys(workers=None):
+    pubkeys = [memo.privtopub(privkey) for privkey in PRIVKEYS]
+    return [
         {
-            'input': pubkeys_serial,
-            'output': '0x' + bls.aggregate_pubkeys(pubkeys).hex(),
+            'input': ['0x' + pubkey.hex() for pubkey in pubkeys],
+            'output': '0x' + memo.aggregate_pubkeys(tuple(pubkeys)).hex(),
         }
     ]
 
-    # TODO
-    # Aggregate verify
 
-    # TODO
-    # Proof-of-possession
+def case08_aggregate_verify(workers=None):
+    valid_aggregate_inputs, invalid_aggregate_inputs = get_aggregate_verify_inputs()
+    aggregate_inputs = valid_aggregate_inputs + invalid_aggregate_inputs
+    tasks = [
+        ([memo.hash_to_G2(message, domain) for message in messages], pubkeys, signature)
+        for messages, domain, pubkeys, signature in aggregate_inputs
+    ]
+    memo.aggregate_verify.compute_all(tasks, workers)
+    aggregate_results = [memo.aggregate_verify(*task) for task in tasks]
+    check_results(aggregate_results, len(valid_aggregate_inputs), "Aggregate verification")
 
-    with open(sys.argv[1], 'w') as outfile:
-        # Dump at top level
-        yaml.dump(metadata, outfile, default_flow_style=False)
-        # default_flow_style will unravel "ValidatorRecord" and "committee" line,
-        # exploding file size
-        yaml.dump(
-            {'case01_message_hash_G2_uncompressed': case01_message_hash_G2_uncompressed},
-            outfile,
-        )
-        yaml.dump(
-            {'case02_message_hash_G2_compressed': case02_message_hash_G2_compressed},
-            outfile,
-        )
-        yaml.dump(
-            {'case03_private_to_public_key': case03_private_to_public_key},
-            outfile,
-        )
-        yaml.dump({'case04_sign_messages': case04_sign_messages}, outfile)
+    return [
+        make_aggregate_verify_case(*aggregate_input, result)
+        for aggregate_input, result in zip(aggregate_inputs, aggregate_results)
+    ]
+
+
+def case09_proof_of_possession(workers=None):
+    # Proofs of possession sign the hash of the public key
+    valid_pop_inputs, invalid_pop_inputs = get_proof_of_possession_inputs()
+    pop_inputs = valid_pop_inputs + invalid_pop_inputs
+    tasks = [
+        (memo.hash_to_G2(keccak(pubkey), domain), pubkey, proof)
+        for pubkey, domain, proof in pop_inputs
+    ]
+    memo.verify_message_point.compute_all(tasks, workers)
+    pop_results = [memo.verify_message_point(*task) for task in tasks]
+    check_results(pop_results, len(valid_pop_inputs), "Proof-of-possession")
+
+    return [
+        make_proof_of_possession_case(*pop_input, result)
+        for pop_input, result in zip(pop_inputs, pop_results)
+    ]
+
+
+# Sections of the output file, in order
+SECTIONS = [
+    case01_message_hash_G2_uncompressed,
+    case02_message_hash_G2_compressed,
+    case03_private_to_public_key,
+    case04_sign_messages,
+    case05_verify_messages,
+    case06_aggregate_sigs,
+    case07_aggregate_pubkeys,
+    case08_aggregate_verify,
+    case09_proof_of_possession,
+]
+
+# Changes to these files invalidate the checkpoint of an interrupted run
+SOURCE_FILES = [
+    os.path.abspath(__file__),
+    memo.__file__,
+    bls_cache.__file__,
+    keys.__file__,
+    verification.__file__,
+    yaml_emit.__file__,
+]
+
+
+def precompute(workers=None):
+    """
+    Compute every message hash, signature and public key once, the sections reuse them
+    """
+    memo.sign.compute_all(
+        [
+            (message, privkey, domain)
+            for privkey in PRIVKEYS
+            for message in MESSAGES
+            for domain in DOMAINS
+        ],
+        workers,
+    )
+    memo.privtopub.compute_all(
+        [(privkey,) for privkey in PRIVKEYS] +
+        [(derive_privkey(index),) for index in range(max(COMMITTEE_SIZES) + 1)],
+        workers,
+    )
+    memo.sign.compute_all(
+        [
+            (keccak(memo.privtopub(privkey)), privkey, domain)
+            for privkey in PRIVKEYS
+            for domain in DOMAINS
+        ],
+        workers,
+    )
+
+
+parser = argparse.ArgumentParser(
+    prog="tgen_bls",
+    description="Generate YAML test vectors for BLS signatures",
+)
+parser.add_argument(
+    "output_file",
+    help="path of the generated YAML file",
+)
+parser.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    default=None,
+    help="compute message hashes, signatures and verifications on this many processes",
+)
+parser.add_argument(
+    "--cache-dir",
+    default=CACHE_DIR,
+    help="directory of the persistent cache of BLS results (default: %(default)s)",
+)
+parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    default=False,
+    help="always compute the BLS results instead of using the persistent cache",
+)
+parser.add_argument(
+    "--restart",
+    action="store_true",
+    default=False,
+    help="ignore the checkpoint of an interrupted run and write every section again",
+)
+parser.add_argument(
+    "--format",
+    choices=["yaml", "binary"],
+    default="yaml",
+    help="write a YAML file, or a binary test vector container (.bin) with an index of the test "
+         "cases (default: %(default)s)",
+)
+parser.add_argument(
+    "--chunk-size",
+    type=int,
+    default=None,
+    help="split the test cases into files of this many test cases, listed in a manifest",
+)
+parser.add_argument(
+    "--compress",
+    choices=COMPRESSIONS,
+    default=None,
+    help="compress the output files while they are written, and write the digest of every "
+         "compressed file to a .sha256 sidecar",
+)
+parser.add_argument(
+    "--compress-level",
+    type=int,
+    default=None,
+    help="compression level, 1-9 (0-9 for xz, default: the default level of the compression)",
+)
+parser.add_argument(
+    "--yaml-emitter",
+    choices=["fast", "library"],
+    default="fast",
+    help="write the test cases directly (fast), or always with the YAML library (default: "
+         "%(default)s)",
+)
+parser.add_argument(
+    "--verify-yaml",
+    action="store_true",
+    default=False,
+    help="check that the output loads as the same documents as the output of the pure Python "
+         "emitter",
+)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    # Load the table before forking the workers, which inherit it
+    use_g1_table(None if args.no_cache else args.cache_dir)
+    memo.use_cache(None if args.no_cache else BLSCache(args.cache_dir))
+
+    # Order not preserved - https://github.com/yaml/pyyaml/issues/110
+    metadata = {
+        'title': 'BLS signature and aggregation tests',
+        'summary': 'Test vectors for BLS signature',
+        'test_suite': 'bls',
+        'fork': 'phase0-0.5.0',
+    }
+
+    emitter = YAMLEmitter(
+        PyYAMLLibrary(default_flow_style=None),
+        fast=args.yaml_emitter == 'fast',
+        verify=args.verify_yaml,
+    )
+    if args.format == 'binary' or args.chunk_size:
+        # Binary containers end with their index and chunks with their manifest, so these are
+        # written at once instead of resuming, the persistent cache makes a rerun cheap
+        precompute(args.workers)
+        output_file = args.output_file
+        if args.format == 'binary':
+            output_file = os.path.splitext(output_file)[0] + '.bin'
+        with open_output(
+                output_file,
+                None if args.format == 'binary' else emitter,
+                args.chunk_size,
+                compression=args.compress,
+                level=args.compress_level) as output:
+            output.dump(metadata)
+            for section in SECTIONS:
+                output.dump({section.__name__: section(args.workers)})
+    else:
+        with CheckpointedOutput(
+                args.output_file,
+                source_digest(SOURCE_FILES),
+                resume=not args.restart,
+                compression=args.compress,
+                level=args.compress_level) as output:
+            if not all(output.is_done(section.__name__) for section in SECTIONS):
+                precompute(args.workers)
+
+            # Dump at top level
+            output.write_section('metadata', lambda outfile: emitter.dump(metadata, outfile))
+            # default_flow_style will unravel "ValidatorRecord" and "committee" line,
+            # exploding file size
+            for section in SECTIONS:
+                output.write_section(
+                    section.__name__,
+                    lambda outfile: emitter.dump({section.__name__: section(args.workers)}, outfile),
+                )
 
-        # Too time consuming to generate
-        # yaml.dump({'case05_verify_messages': case05_verify_messages}, outfile)
-        yaml.dump({'case06_aggregate_sigs': case06_aggregate_sigs}, outfile)
-        yaml.dump({'case07_aggregate_pubkeys': case07_aggregate_pubkeys}, outfile)
+    if args.verify_yaml:
+        print(emitter.report())
@@ -0,0 +1,165 @@
+"""
+BLS aggregation test vectors generator, for thousands of signers
+Usage:
+    "python tgen_bls_aggregation path/to/output.yml"
+"""
+
+# Standard library
+import argparse
+import os
+import sys
+
+# Shared generator helpers live at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import memo  # noqa: E402
+from aggregation import LEAF_SIZE, aggregate_signers  # noqa: E402
+from bls_cache import CACHE_DIR, BLSCache  # noqa: E402
+from gen_helpers.compression import COMPRESSIONS  # noqa: E402
+from gen_helpers.output import open_output  # noqa: E402
+from gen_helpers.yaml_emit import PyYAMLLibrary, YAMLEmitter  # noqa: E402
+from keys import derive_privkey, use_g1_table  # noqa: E402
+
+MAX_SIGNERS = 4096
+
+MESSAGE = b'\xab' * 32
+
+DOMAIN = 1234
+
+
+def validate_signer_count(value):
+    signer_count = int(value)
+    if signer_count < 1:
+        raise argparse.ArgumentTypeError("At least one signer is needed")
+    return signer_count
+
+
+parser = argparse.ArgumentParser(
+    prog="tgen_bls_aggregation",
+    description="Generate YAML test vectors for the aggregation of many BLS public keys and signatures",
+)
+parser.add_argument(
+    "output_file",
+    help="path of the generated YAML file",
+)
+parser.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    default=None,
+    help="sign and aggregate on this many processes",
+)
+parser.add_argument(
+    "--max-signers",
+    type=validate_signer_count,
+    default=MAX_SIGNERS,
+    help="number of signers of the largest aggregate (default: %(default)s)",
+)
+parser.add_argument(
+    "--cache-dir",
+    default=CACHE_DIR,
+    help="directory of the persistent cache of BLS results (default: %(default)s)",
+)
+parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    default=False,
+    help="always compute the BLS results instead of using the persistent cache",
+)
+parser.add_argument(
+    "--format",
+    choices=["yaml", "binary"],
+    default="yaml",
+    help="write a YAML file, or a binary test vector container (.bin) with an index of the test "
+         "cases (default: %(default)s)",
+)
+parser.add_argument(
+    "--chunk-size",
+    type=int,
+    default=None,
+    help="split the test cases into files of this many test cases, listed in a manifest",
+)
+parser.add_argument(
+    "--compress",
+    choices=COMPRESSIONS,
+    default=None,
+    help="compress the output files while they are written, and write the digest of every "
+         "compressed file to a .sha256 sidecar",
+)
+parser.add_argument(
+    "--compress-level",
+    type=int,
+    default=None,
+    help="compression level, 1-9 (0-9 for xz, default: the default level of the compression)",
+)
+parser.add_argument(
+    "--yaml-emitter",
+    choices=["fast", "library"],
+    default="fast",
+    help="write the test cases directly (fast), or always with the YAML library (default: "
+         "%(default)s)",
+)
+parser.add_argument(
+    "--verify-yaml",
+    action="store_true",
+    default=False,
+    help="check that the output loads as the same documents as the output of the pure Python "
+         "emitter",
+)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    # Load the table before forking the workers, which inherit it
+    use_g1_table(None if args.no_cache else args.cache_dir)
+    memo.use_cache(None if args.no_cache else BLSCache(args.cache_dir))
+
+    metadata = {
+        'title': 'BLS aggregation tests',
+        'summary': f'Aggregation of the public keys and signatures of {LEAF_SIZE} to {args.max_signers} signers',
+        'test_suite': 'bls',
+        'fork': 'phase0-0.5.0',
+    }
+
+    # Every signer signs the same message, aggregates are checkpointed at 128, 256... signers
+    pubkeys, signatures, checkpoints = aggregate_signers(
+        [derive_privkey(index) for index in range(args.max_signers)],
+        MESSAGE,
+        DOMAIN,
+        args.workers,
+    )
+
+    case01_aggregate_pubkeys = [
+        {
+            'input': ['0x' + pubkey.hex() for pubkey in pubkeys[:count]],
+            'output': '0x' + aggregate_pubkey.hex(),
+        }
+        for count, aggregate_pubkey, _ in checkpoints
+    ]
+
+    case02_aggregate_sigs = [
+        {
+            'input': ['0x' + signature.hex() for signature in signatures[:count]],
+            'output': '0x' + aggregate_signature.hex(),
+        }
+        for count, _, aggregate_signature in checkpoints
+    ]
+
+    emitter = YAMLEmitter(
+        PyYAMLLibrary(default_flow_style=None),
+        fast=args.yaml_emitter == 'fast',
+        verify=args.verify_yaml,
+    )
+    output_file = args.output_file
+    if args.format == 'binary':
+        output_file = os.path.splitext(output_file)[0] + '.bin'
+    with open_output(
+            output_file,
+            None if args.format == 'binary' else emitter,
+            args.chunk_size,
+            compression=args.compress,
+            level=args.compress_level) as output:
+        output.dump(metadata)
+        output.dump({'case01_aggregate_pubkeys': case01_aggregate_pubkeys})
+        output.dump({'case02_aggregate_sigs': case02_aggregate_sigs})
+    if args.verify_yaml:
+        print(emitter.report())
@@ -0,0 +1,155 @@
+"""
+Individual, aggregate and randomized batch verification of BLS signatures over memoized
+message hashes, computing all pairings of a check in one multi-Miller loop
+"""
+import secrets
+from typing import Any, List, Optional, Sequence, Tuple
+
+from eth_typing import BLSPubkey, BLSSignature
+from eth_utils import ValidationError
+from py_ecc.bls.utils import pubkey_to_G1, signature_to_G2
+from py_ecc.fields import optimized_bls12_381_FQ12 as FQ12
+from py_ecc.optimized_bls12_381 import (
+    G1,
+    Z1,
+    Z2,
+    add,
+    b,
+    b2,
+    double,
+    final_exponentiate,
+    is_inf,
+    is_on_curve,
+    multiply,
+    neg,
+    twist,
+)
+from py_ecc.optimized_bls12_381.optimized_pairing import (
+    cast_point_to_fq12,
+    linefunc,
+    pseudo_binary_encoding,
+)
+
+from gen_helpers.parallel import map_cases
+
+# Bit length of the random scalars of batch verification
+BATCH_SCALAR_BITS = 64
+
+
+def multi_miller_loop(pairs: Sequence[Tuple[Any, Any]]) -> FQ12:
+    """
+    Return the product of ``pairing(Q, P, final_exponentiate=False)`` over the ``(Q, P)`` pairs
+    of G2 and G1 points. All pairs go through a single Miller loop, so the accumulator is
+    squared once per iteration instead of once per pair and iteration.
+    """
+    points = []
+    for Q, P in pairs:
+        if not is_on_curve(Q, b2) or not is_on_curve(P, b):
+            raise ValueError("Pairing input is not on the curve")
+        if is_inf(Q) or is_inf(P):
+            continue
+        points.append((twist(Q), cast_point_to_fq12(P)))
+
+    R = [Q for Q, _ in points]
+    f_num, f_den = FQ12.one(), FQ12.one()
+    for v in pseudo_binary_encoding[62::-1]:
+        f_num = f_num * f_num
+        f_den = f_den * f_den
+        for i, (Q, P) in enumerate(points):
+            _n, _d = linefunc(R[i], R[i], P)
+            f_num = f_num * _n
+            f_den = f_den * _d
+            R[i] = double(R[i])
+            if v == 1:
+                _n, _d = linefunc(R[i], Q, P)
+                f_num = f_num * _n
+                f_den = f_den * _d
+                R[i] = add(R[i], Q)
+            elif v == -1:
+                nQ = neg(Q)
+                _n, _d = linefunc(R[i], nQ, P)
+                f_num = f_num * _n
+                f_den = f_den * _d
+                R[i] = add(R[i], nQ)
+    return f_num / f_den
+
+
+def verify_message_point(message_point: Any, pubkey: BLSPubkey, signature: BLSSignature) -> bool:
+    """
+    Same as ``bls.verify``, for a message already hashed to G2
+    """
+    try:
+        final_exponentiation = final_exponentiate(multi_miller_loop([
+            (signature_to_G2(signature), G1),
+            (message_point, neg(pubkey_to_G1(pubkey))),
+        ]))
+        return final_exponentiation == FQ12.one()
+    except (ValidationError, ValueError, AssertionError):
+        return False
+
+
+def aggregate_verify(message_points: Sequence[Any],
+                     pubkeys: Sequence[Sequence[BLSPubkey]],
+                     signature: BLSSignature) -> bool:
+    """
+    Same as ``bls.verify_multiple``, with the messages already hashed to G2 and the public keys
+    grouped by message: ``pubkeys[i]`` are the signers of ``message_points[i]``.
+    Checks ``prod(e(H_i, -sum(pubkeys[i]))) * e(signature, G1) == 1`` with one multi-Miller loop
+    and one final exponentiation, whatever the number of signers.
+    Returns ``False`` if there is not one group of public keys per message.
+    """
+    if len(message_points) != len(pubkeys):
+        return False
+    try:
+        pairs = [(signature_to_G2(signature), G1)]
+        for message_point, group in zip(message_points, pubkeys):
+            group_pubkey = Z1
+            for pubkey in group:
+                group_pubkey = add(group_pubkey, pubkey_to_G1(pubkey))
+            pairs.append((message_point, neg(group_pubkey)))
+        return final_exponentiate(multi_miller_loop(pairs)) == FQ12.one()
+    except (ValidationError, ValueError, AssertionError):
+        return False
+
+
+def batch_miller_loops(tasks: Sequence[Tuple[Any, BLSPubkey, BLSSignature, int]]) -> Tuple[FQ12, Any]:
+    """
+    Return the product of the Miller loops of ``e(H_i, -r_i * pubkey_i)`` and the sum of
+    ``r_i * signature_i`` over the ``(H_i, pubkey_i, signature_i, r_i)`` in ``tasks``
+    """
+    pairs = []
+    aggregate = Z2
+    for message_point, pubkey, signature, scalar in tasks:
+        aggregate = add(aggregate, multiply(signature_to_G2(signature), scalar))
+        pairs.append((message_point, neg(multiply(pubkey_to_G1(pubkey), scalar))))
+    return multi_miller_loop(pairs), aggregate
+
+
+def batch_verify(message_points: Sequence[Any],
+                 pubkeys: Sequence[BLSPubkey],
+                 signatures: Sequence[BLSSignature],
+                 workers: Optional[int] = None) -> bool:
+    """
+    Verify all signatures at once: with random scalars ``r_i``, check that
+    ``prod(e(H_i, -r_i * pubkey_i)) * e(sum(r_i * signature_i), G1) == 1``.
+    The Miller loops are split over ``workers`` processes and share one final exponentiation.
+    Returns ``False`` if any signature is invalid, up to a ``2**-BATCH_SCALAR_BITS`` probability.
+    """
+    tasks = [
+        (message_point, pubkey, signature, secrets.randbits(BATCH_SCALAR_BITS) | 1)
+        for message_point, pubkey, signature in zip(message_points, pubkeys, signatures)
+    ]
+    chunk_count = max(1, workers or 1)
+    chunks: List[List[Any]] = [tasks[i::chunk_count] for i in range(chunk_count)]
+
+    try:
+        product = FQ12.one()
+        aggregate = Z2
+        for chunk_product, chunk_aggregate in map_cases(
+                batch_miller_loops, [(chunk,) for chunk in chunks], workers):
+            product *= chunk_product
+            aggregate = add(aggregate, chunk_aggregate)
+        product *= multi_miller_loop([(aggregate, G1)])
+        return final_exponentiate(product) == FQ12.one()
+    except (ValidationError, ValueError, AssertionError):
+        return False
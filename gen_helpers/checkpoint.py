@@ -0,0 +1,141 @@
+"""
+Incremental output of generators whose sections take long to compute.
+
+Every section is appended to the output file, flushed and fsynced as soon as it is complete,
+and recorded with the size of the file after it in a sidecar checkpoint file. A rerun that
+is interrupted before the end then resumes from the first incomplete section, and the output
+file ends up the same as if it was written at once.
+
+A compressed output file is written as one compressed stream per section, so that the
+checkpoint sizes are always at the end of a complete stream.
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+from typing import Callable, IO, Iterable, List, Optional
+
+from gen_helpers.compression import get_compressed_path, open_compressor, write_digest_sidecar
+from gen_helpers.pipeline import BackgroundWriter
+
+
+def source_digest(paths: Iterable[str]) -> str:
+    """
+    Return a digest of the files at ``paths``, so that a checkpoint made by other generator
+    code is not resumed.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def fsync_directory(path: str) -> None:
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class CheckpointedOutput:
+    """
+    Writes the sections of ``path`` in order, resuming after the sections recorded in the
+    checkpoint ``path + '.checkpoint'`` if it was made with the same ``key``.
+    The checkpoint is removed once the output is complete.
+
+    With ``compression`` set, the output is compressed at ``level``, its path gets the suffix of
+    the compression, and its digest sidecar is written once it is complete.
+    """
+
+    def __init__(self,
+                 path: str,
+                 key: str,
+                 resume: bool = True,
+                 compression: Optional[str] = None,
+                 level: Optional[int] = None) -> None:
+        self.path = get_compressed_path(path, compression)
+        self.checkpoint_path = self.path + '.checkpoint'
+        self.key = key
+        self.resume = resume
+        self.compression = compression
+        self.level = level
+        self.sections: List[str] = []
+        self.outfile: Optional[IO] = None
+
+    def load_checkpoint(self) -> List[str]:
+        """
+        Return the completed sections of the checkpoint, after truncating the output to them.
+        """
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            size = os.path.getsize(self.path)
+        except (FileNotFoundError, ValueError):
+            return []
+        if checkpoint.get('key') != self.key or size < checkpoint['size']:
+            return []
+        os.truncate(self.path, checkpoint['size'])
+        return checkpoint['sections']
+
+    def save_checkpoint(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.checkpoint_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({
+                'key': self.key,
+                'sections': self.sections,
+                'size': os.path.getsize(self.path),
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+        fsync_directory(self.checkpoint_path)
+
+    def __enter__(self) -> 'CheckpointedOutput':
+        self.sections = self.load_checkpoint() if self.resume else []
+        mode = 'a' if self.sections else 'w'
+        self.outfile = open(self.path, mode if self.compression is None else mode + 'b')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.outfile.close()
+        if exc_type is None:
+            if self.compression is not None:
+                write_digest_sidecar(self.path)
+            try:
+                os.remove(self.checkpoint_path)
+            except FileNotFoundError:
+                pass
+
+    def is_done(self, section: str) -> bool:
+        return section in self.sections
+
+    def write_section(self, section: str, write: Callable[[IO[str]], None]) -> None:
+        """
+        Append ``section`` with ``write(outfile)``, unless it is complete already, then make it
+        durable and record it in the checkpoint. ``outfile`` is written on a ``BackgroundWriter``
+        thread.
+        """
+        if self.is_done(section):
+            return
+        if self.compression is None:
+            writer = BackgroundWriter(self.outfile)
+            try:
+                write(writer)
+            finally:
+                writer.close()
+        else:
+            compressor = open_compressor(self.outfile, self.compression, self.level)
+            with io.TextIOWrapper(compressor, encoding='utf-8') as outfile:
+                writer = BackgroundWriter(outfile)
+                try:
+                    write(writer)
+                finally:
+                    writer.close()
+        self.outfile.flush()
+        os.fsync(self.outfile.fileno())
+        self.sections.append(section)
+        self.save_checkpoint()
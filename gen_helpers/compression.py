@@ -0,0 +1,107 @@
+"""
+Streaming compression of the output files.
+
+Output is written through a compressor on top of the output file, so that uncompressed files
+are never written. Compressed files are the same for the same content (gzip headers hold no
+timestamp or file name), and every compressed file gets a ``<file>.sha256`` sidecar in the
+format of ``sha256sum``, so that it can be checked with ``sha256sum -c``.
+
+Concatenated gzip, xz and bz2 streams decompress to the concatenation of their contents, so
+that a file can be written as several streams, one per resumable section.
+"""
+import bz2
+import gzip
+import hashlib
+import io
+import lzma
+import os
+from typing import IO, BinaryIO, Optional
+
+from gen_helpers.pipeline import BackgroundWriter
+
+COMPRESSIONS = ['gzip', 'xz', 'bz2']
+
+SUFFIXES = {
+    'gzip': '.gz',
+    'xz': '.xz',
+    'bz2': '.bz2',
+}
+
+DIGEST_SUFFIX = '.sha256'
+
+
+def get_compressed_path(path: str, compression: Optional[str]) -> str:
+    return path if compression is None else path + SUFFIXES[compression]
+
+
+def open_compressor(fileobj: BinaryIO, compression: str, level: Optional[int] = None) -> BinaryIO:
+    """
+    Return a writable binary stream that compresses to ``fileobj``, at the default level of
+    ``compression`` unless ``level`` is given. Closing it does not close ``fileobj``.
+    """
+    if compression == 'gzip':
+        return gzip.GzipFile(
+            filename='', mode='wb', compresslevel=9 if level is None else level, fileobj=fileobj, mtime=0)
+    if compression == 'xz':
+        return lzma.LZMAFile(fileobj, 'wb', preset=level)
+    if compression == 'bz2':
+        return bz2.BZ2File(fileobj, 'wb', compresslevel=9 if level is None else level)
+    raise ValueError(f"Unknown compression {compression}")
+
+
+def get_file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(2**20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_digest_sidecar(path: str) -> None:
+    with open(path + DIGEST_SUFFIX, 'w') as f:
+        f.write(f'{get_file_digest(path)}  {os.path.basename(path)}\n')
+
+
+class OutputFile:
+    """
+    A file written at ``path``, through the streaming compressor of ``compression`` if it is
+    set, in which case the path gets its suffix and the digest sidecar is written once the file
+    is complete. With ``exclusive`` set, an existing file is not overwritten.
+
+    The file is written on a ``BackgroundWriter`` thread, which also encodes and compresses.
+    """
+
+    def __init__(self,
+                 path: str,
+                 binary: bool = False,
+                 compression: Optional[str] = None,
+                 level: Optional[int] = None,
+                 exclusive: bool = False) -> None:
+        self.path = get_compressed_path(path, compression)
+        self.binary = binary
+        self.compression = compression
+        self.level = level
+        self.mode = 'x' if exclusive else 'w'
+
+    def open(self) -> IO:
+        if self.compression is None:
+            self.file = self.stream = open(self.path, self.mode + ('b' if self.binary else ''))
+        else:
+            self.file = open(self.path, self.mode + 'b')
+            self.stream = open_compressor(self.file, self.compression, self.level)
+            if not self.binary:
+                self.stream = io.TextIOWrapper(self.stream, encoding='utf-8')
+        self.writer = BackgroundWriter(self.stream)
+        return self.writer
+
+    def close(self, complete: bool = True) -> None:
+        try:
+            self.writer.close()
+        finally:
+            try:
+                if self.stream is not self.file:
+                    self.stream.close()
+            finally:
+                self.file.close()
+        if complete and self.compression is not None:
+            write_digest_sidecar(self.path)
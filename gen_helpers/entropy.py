@@ -0,0 +1,86 @@
+"""
+Deterministic entropy for test case generation.
+
+Every generator derives named, independent streams from its seed instead of reseeding the
+global ``random`` module, and draws bytes and integers in bulk with ``getrandbits``.
+The compatibility mode reproduces the outputs of the per-value draws and of the shared global
+stream the generators used before.
+"""
+import hashlib
+import random
+from typing import Any, List, Optional, Union
+
+
+def derive_seed(seed: int, name: Union[str, int]) -> int:
+    """
+    Return the seed of the stream ``name`` of a generator seeded with ``seed``.
+    """
+    digest = hashlib.sha256(f'{seed}:{name}'.encode()).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class Entropy(random.Random):
+    """
+    A ``random.Random`` with bulk draws.
+
+    With ``compat`` set, the bulk draws make the same per-value calls as the code they replace,
+    so that they return the same values.
+    """
+
+    def __new__(cls, seed: Any = None, compat: bool = False) -> 'Entropy':
+        # ``random.Random.__new__`` only accepts the seed before Python 3.11
+        return super().__new__(cls, seed)
+
+    def __init__(self, seed: Any = None, compat: bool = False) -> None:
+        super().__init__(seed)
+        self.compat = compat
+
+    def __reduce__(self):
+        return self.__class__, (None, self.compat), self.getstate()
+
+    def random_bytes(self, length: int) -> bytes:
+        if self.compat:
+            return bytes(self.randint(0, 255) for _ in range(length))
+        if length == 0:
+            return b''
+        return self.getrandbits(8 * length).to_bytes(length, 'little')
+
+    def random_uints(self, count: int, bits: int) -> List[int]:
+        """
+        Return ``count`` integers drawn uniformly from ``[0, 2**bits)``
+        """
+        if self.compat:
+            return [self.randrange(0, 2**bits) for _ in range(count)]
+        if bits % 8:
+            return [self.getrandbits(bits) for _ in range(count)]
+        size = bits // 8
+        data = self.random_bytes(size * count)
+        return [int.from_bytes(data[i:i + size], 'little') for i in range(0, len(data), size)]
+
+
+def named_stream(seed: int, name: Union[str, int], compat: bool = False) -> Entropy:
+    """
+    Return the stream ``name`` of a generator seeded with ``seed``.
+    """
+    return Entropy(derive_seed(seed, name), compat)
+
+
+def get_case_streams(seed: int,
+                     name: str,
+                     case_count: int,
+                     workers: Optional[int] = None,
+                     compat: bool = False,
+                     legacy_stream: Optional[Entropy] = None) -> List[Entropy]:
+    """
+    Return the streams of the ``case_count`` cases of generator ``name``.
+
+    By default case ``i`` draws from the stream ``{name}/{i}``, so cases are independent of each
+    other and of ``workers``. In compatibility mode, all cases share ``legacy_stream`` (a stream
+    seeded with ``seed`` by default) as they shared the global ``random`` stream, unless
+    ``workers`` is set, in which case case ``i`` draws from the stream ``i``.
+    """
+    if not compat:
+        return [named_stream(seed, f'{name}/{index}') for index in range(case_count)]
+    if workers is None:
+        return [legacy_stream or Entropy(seed, compat=True)] * case_count
+    return [named_stream(seed, index, compat=True) for index in range(case_count)]
@@ -0,0 +1,213 @@
+"""
+Output files of the generators: a YAML file, a binary test vector container, or chunks of
+either listed in a manifest.
+
+All outputs are written with ``dump(data)`` for top level mappings and
+``dump_sequence(key, items)`` for top level sequences of test cases generated lazily, as with
+``YAMLEmitter``.
+
+Sharded output splits every top level sequence of test cases into chunk files of a fixed
+number of test cases, written like the whole file would be (the top level entries that are not
+sequences, such as the title, are repeated in every chunk). A manifest lists every chunk with
+its path, section, range of test cases, size and digest, so that consumers can load chunks in
+parallel, and regenerating a suite only changes the chunks whose test cases changed.
+
+Every output file can be written through a streaming compressor, see ``compression``.
+"""
+import json
+import os
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional
+
+from gen_helpers.compression import DIGEST_SUFFIX, OutputFile, get_file_digest
+from gen_helpers.vector_container import VectorWriter
+
+Converters = Optional[Dict[type, Callable[[Any], Any]]]
+
+
+class YAMLOutput:
+    """
+    Writes a YAML file with ``emitter``, compressed with ``compression`` if it is set.
+    """
+
+    def __init__(self,
+                 path: str,
+                 emitter: Any,
+                 exclusive: bool = False,
+                 compression: Optional[str] = None,
+                 level: Optional[int] = None) -> None:
+        self.output_file = OutputFile(path, False, compression, level, exclusive)
+        self.path = self.output_file.path
+        self.emitter = emitter
+
+    def __enter__(self) -> 'YAMLOutput':
+        self.file = self.output_file.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.output_file.close(exc_type is None)
+
+    def dump(self, data: Mapping[Any, Any]) -> None:
+        self.emitter.dump(data, self.file)
+
+    def dump_sequence(self, key: Any, items: Iterable[Any]) -> None:
+        self.emitter.dump_sequence(key, items, self.file)
+
+
+class ContainerOutput(VectorWriter):
+    """
+    Writes a binary test vector container, compressed with ``compression`` if it is set (the
+    offsets of the index are offsets in the decompressed container).
+    """
+
+    def __init__(self,
+                 path: str,
+                 converters: Converters = None,
+                 exclusive: bool = False,
+                 compression: Optional[str] = None,
+                 level: Optional[int] = None) -> None:
+        super().__init__(None, converters)
+        self.output_file = OutputFile(path, True, compression, level, exclusive)
+        self.path = self.output_file.path
+
+    def __enter__(self) -> 'ContainerOutput':
+        self.stream = self.output_file.open()
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            self.output_file.close(exc_type is None)
+
+
+class ShardedOutput:
+    """
+    Writes the chunks of the suite that would be written to ``path`` as
+    ``<stem>.<section>.<chunk index><suffix>``, and the manifest ``<stem>.manifest.json``.
+
+    Chunks are YAML files dumped with ``emitter``, or binary test vector containers if it is
+    ``None``, compressed with ``compression`` if it is set (the manifest is not compressed).
+    With ``exclusive`` set, existing files are not overwritten.
+    Chunks listed in a previous manifest that are not part of the suite anymore are removed.
+    """
+
+    def __init__(self,
+                 path: str,
+                 chunk_size: int,
+                 emitter: Optional[Any] = None,
+                 converters: Converters = None,
+                 exclusive: bool = False,
+                 compression: Optional[str] = None,
+                 level: Optional[int] = None) -> None:
+        if chunk_size < 1:
+            raise ValueError("Chunks must hold at least one test case")
+        self.stem, self.suffix = os.path.splitext(path)
+        self.directory = os.path.dirname(path)
+        self.manifest_path = self.stem + '.manifest.json'
+        self.chunk_size = chunk_size
+        self.emitter = emitter
+        self.converters = converters
+        self.exclusive = exclusive
+        self.compression = compression
+        self.level = level
+        self.entries: Dict[Any, Any] = {}
+        self.chunks: List[Dict[str, Any]] = []
+
+    def __enter__(self) -> 'ShardedOutput':
+        if self.exclusive and os.path.exists(self.manifest_path):
+            raise FileExistsError(f"File exists: '{self.manifest_path}'")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+
+    def dump(self, data: Mapping[Any, Any]) -> None:
+        for key, value in data.items():
+            if isinstance(value, (list, tuple)):
+                self.dump_sequence(key, value)
+            else:
+                self.entries[key] = value
+
+    def dump_sequence(self, key: Any, items: Iterable[Any]) -> None:
+        """
+        Write the chunks of the section ``key``, holding one chunk of ``items`` at a time.
+        """
+        items = iter(items)
+        first_case = 0
+        while True:
+            chunk = list(islice(items, self.chunk_size))
+            if not chunk and first_case:
+                break
+            self.write_chunk(key, first_case, chunk)
+            first_case += len(chunk)
+            if len(chunk) < self.chunk_size:
+                break
+
+    def write_chunk(self, key: Any, first_case: int, items: List[Any]) -> None:
+        path = f'{self.stem}.{key}.{first_case // self.chunk_size:04d}{self.suffix}'
+        with open_output(path, self.emitter,
+                         converters=self.converters,
+                         exclusive=self.exclusive,
+                         compression=self.compression,
+                         level=self.level) as output:
+            output.dump(self.entries)
+            output.dump_sequence(key, items)
+        self.chunks.append({
+            'path': os.path.basename(output.path),
+            'section': key,
+            'first_case': first_case,
+            'case_count': len(items),
+            'size': os.path.getsize(output.path),
+            'sha256': '0x' + get_file_digest(output.path),
+        })
+
+    def get_previous_paths(self) -> List[str]:
+        try:
+            with open(self.manifest_path) as f:
+                return [chunk['path'] for chunk in json.load(f)['chunks']]
+        except (FileNotFoundError, ValueError, KeyError):
+            return []
+
+    def close(self) -> None:
+        """
+        Write the manifest once every chunk is written, then remove the stale chunks.
+        """
+        previous_paths = self.get_previous_paths()
+        with open(self.manifest_path, 'x' if self.exclusive else 'w') as f:
+            json.dump({
+                'entries': self.entries,
+                'chunk_size': self.chunk_size,
+                'chunks': self.chunks,
+            }, f, indent=2)
+            f.write('\n')
+
+        paths = {chunk['path'] for chunk in self.chunks}
+        for path in previous_paths:
+            if path not in paths:
+                for stale_path in (path, path + DIGEST_SUFFIX):
+                    try:
+                        os.remove(os.path.join(self.directory, stale_path))
+                    except FileNotFoundError:
+                        pass
+
+
+def open_output(path: str,
+                emitter: Optional[Any] = None,
+                chunk_size: Optional[int] = None,
+                converters: Converters = None,
+                exclusive: bool = False,
+                compression: Optional[str] = None,
+                level: Optional[int] = None) -> Any:
+    """
+    Return the output to ``path``: a YAML file written with ``emitter``, or a binary test vector
+    container if ``emitter`` is ``None``, split into chunks of ``chunk_size`` test cases if it
+    is set, and compressed with ``compression`` at ``level`` if it is set. The path of a
+    compressed file gets the suffix of the compression.
+    """
+    if chunk_size:
+        return ShardedOutput(path, chunk_size, emitter, converters, exclusive, compression, level)
+    if emitter is None:
+        return ContainerOutput(path, converters, exclusive, compression, level)
+    return YAMLOutput(path, emitter, exclusive, compression, level)
@@ -0,0 +1,43 @@
+"""
+Parallel test case generation.
+
+Cases draw from their own named random streams (see ``gen_helpers.entropy``), so they are
+independent of each other and of the order in which they are computed, and the output is
+the same for any number of worker processes.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence
+
+
+def _call(task):
+    make_case, arguments = task
+    return make_case(*arguments)
+
+
+def map_cases(make_case: Callable[..., Any],
+              arguments: Iterable[Sequence[Any]],
+              workers: Optional[int] = None,
+              window: Optional[int] = None) -> Iterator[Any]:
+    """
+    Yield ``make_case(*args)`` for every ``args`` in ``arguments``, in order.
+
+    With ``workers`` greater than one the cases are computed on a process pool, so
+    ``make_case`` and its arguments must be picklable (module level functions). At most
+    ``window`` cases (four per worker by default) are computed ahead of the consumer, so that
+    the cases waiting to be written do not pile up in memory.
+    """
+    if workers is None or workers <= 1:
+        for args in arguments:
+            yield make_case(*args)
+        return
+
+    window = window or 4 * workers
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: deque = deque()
+        for args in arguments:
+            if len(pending) >= window:
+                yield pending.popleft().result()
+            pending.append(executor.submit(_call, (make_case, tuple(args))))
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,95 @@
+"""
+Pipelined output of the generators.
+
+Generation runs in three stages that overlap:
+
+- the producers compute the test cases lazily, on the process pool of ``map_cases`` that
+  computes a bounded number of cases ahead of their consumer,
+- the emitter or the container writer serializes every case to text or bytes as soon as it is
+  produced (``YAMLEmitter.dump_sequence``, ``VectorWriter.dump_sequence``),
+- a ``BackgroundWriter`` thread encodes, compresses and writes the serialized cases to the
+  output file in order, while the next cases are produced and serialized.
+
+Every stage hands over through a bounded queue, so that memory stays bounded when a stage is
+slower than the others, typically the writes to a network file system.
+"""
+import queue
+import threading
+from typing import IO, Any, List, Optional
+
+
+class BackgroundWriter:
+    """
+    Writes to ``file`` on a writer thread, in the order of the calls to ``write``.
+
+    Writes are batched up to ``buffer_size`` characters or bytes, and at most ``queue_size``
+    batches wait for the writer thread, the writes block once it is full. An error of the
+    writer thread is raised by the following call to ``write``, ``flush`` or ``close``.
+    """
+
+    def __init__(self, file: IO, buffer_size: int = 2**16, queue_size: int = 16) -> None:
+        self.file = file
+        self.buffer_size = buffer_size
+        self.buffer: List[Any] = []
+        self.buffered = 0
+        self.queue: queue.Queue = queue.Queue(queue_size)
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        while True:
+            batch = self.queue.get()
+            try:
+                if batch is None:
+                    return
+                # Keep draining the queue after an error, so that writes do not block forever
+                if self.error is None:
+                    self.file.write(batch)
+            except BaseException as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def check(self) -> None:
+        if self.error is not None:
+            raise self.error
+
+    def write(self, data: Any) -> int:
+        self.check()
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.buffer_size:
+            self.send()
+        return len(data)
+
+    def send(self) -> None:
+        if self.buffer:
+            batch = self.buffer[0][:0].join(self.buffer)
+            self.buffer = []
+            self.buffered = 0
+            self.queue.put(batch)
+
+    def flush(self) -> None:
+        """
+        Wait until everything written so far is written to ``file``, and flush it.
+        """
+        self.send()
+        self.queue.join()
+        self.check()
+        self.file.flush()
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def close(self) -> None:
+        """
+        Flush and stop the writer thread, ``file`` is left open.
+        """
+        if not self.thread.is_alive():
+            return
+        try:
+            self.flush()
+        finally:
+            self.queue.put(None)
+            self.thread.join()
@@ -0,0 +1,21 @@
+import pickle
+
+from gen_helpers.entropy import Entropy, get_case_streams, named_stream
+
+
+def test_compat_entropy_round_trips_through_pickle():
+    for compat in (False, True):
+        rng = Entropy(1234, compat)
+        rng.random_bytes(5)
+        copy = pickle.loads(pickle.dumps(rng))
+        assert isinstance(copy, Entropy)
+        assert copy.compat == compat
+        assert copy.random_uints(4, 64) == rng.random_uints(4, 64)
+
+
+def test_named_streams():
+    assert named_stream(0, 'uint', compat=True).compat
+    streams = get_case_streams(0, 'uint', 3)
+    assert [stream.random_bytes(8) for stream in streams] == [
+        named_stream(0, f'uint/{index}').random_bytes(8) for index in range(3)
+    ]
@@ -0,0 +1,261 @@
+"""
+Binary container of test vectors, an alternative to the YAML files that can be read a test
+case at a time.
+
+Layout, all integers little-endian::
+
+    magic b'E2TV' | version: u32
+    record*                                 every test case, in order
+    header record                           see below
+    offset: u64 * record count              offset of every test case record
+    header offset: u64 | index offset: u64 | record count: u64 | magic b'E2TV'
+
+A record is ``length: u32`` followed by ``length`` bytes of one encoded value:
+
+    b'N'                                    None
+    b'T' / b'F'                             True / False
+    b'I' length: u8 | signed integer        int
+    b'D' f64                                float
+    b'B' length: u32 | bytes                bytes, and the '0x' prefixed hex strings of the
+                                            YAML files (serials, signatures, hashes...)
+    b'S' length: u32 | UTF-8 bytes          other strings
+    b'L' count: u32 | value*                list
+    b'M' count: u32 | (key value)*          mapping
+
+The header record maps ``entries`` to the top level entries of the YAML file that are not
+sequences (title, summary...), and ``sections`` to a list of ``[name, first record, record
+count]``, one per top level sequence of test cases. A client can mmap the file, read the
+footer, and decode the test case ``n`` at ``index[n]`` without reading anything else.
+"""
+import mmap
+import re
+import struct
+import sys
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+MAGIC = b'E2TV'
+VERSION = 1
+
+FOOTER = struct.Struct('<QQQ4s')
+LENGTH = struct.Struct('<I')
+FLOAT = struct.Struct('<d')
+
+# Strings of the YAML files that are byte strings
+HEX_STRING = re.compile(r'0x(?:[0-9a-fA-F]{2})*')
+
+
+def encode_value(value: Any,
+                 pieces: List[bytes],
+                 converters: Optional[Dict[type, Callable[[Any], Any]]] = None) -> None:
+    if converters:
+        converter = converters.get(type(value))
+        if converter is not None:
+            value = converter(value)
+    if value is None:
+        pieces.append(b'N')
+    elif value is True:
+        pieces.append(b'T')
+    elif value is False:
+        pieces.append(b'F')
+    elif isinstance(value, int):
+        data = value.to_bytes((value.bit_length() + 8) // 8, 'little', signed=True)
+        pieces.append(b'I' + bytes([len(data)]) + data)
+    elif isinstance(value, float):
+        pieces.append(b'D' + FLOAT.pack(value))
+    elif isinstance(value, str):
+        if HEX_STRING.fullmatch(value):
+            data = bytes.fromhex(value[2:])
+            pieces.append(b'B' + LENGTH.pack(len(data)) + data)
+        else:
+            data = value.encode()
+            pieces.append(b'S' + LENGTH.pack(len(data)) + data)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        pieces.append(b'B' + LENGTH.pack(len(value)) + bytes(value))
+    elif isinstance(value, (list, tuple)):
+        pieces.append(b'L' + LENGTH.pack(len(value)))
+        for item in value:
+            encode_value(item, pieces, converters)
+    elif isinstance(value, Mapping):
+        pieces.append(b'M' + LENGTH.pack(len(value)))
+        for key, item in value.items():
+            encode_value(key, pieces, converters)
+            encode_value(item, pieces, converters)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def encode(value: Any, converters: Optional[Dict[type, Callable[[Any], Any]]] = None) -> bytes:
+    pieces: List[bytes] = []
+    encode_value(value, pieces, converters)
+    return b''.join(pieces)
+
+
+def copy_bytes(value: Any) -> Any:
+    """
+    Replace the slices returned by ``decode_from`` with bytes, so that the decoded value does
+    not hold on to the decoded buffer.
+    """
+    if isinstance(value, memoryview):
+        return bytes(value)
+    if isinstance(value, list):
+        return [copy_bytes(item) for item in value]
+    if isinstance(value, dict):
+        return {copy_bytes(key): copy_bytes(item) for key, item in value.items()}
+    return value
+
+
+def decode_from(data: memoryview, offset: int) -> Tuple[Any, int]:
+    """
+    Decode the value at ``offset`` of ``data``, bytes are returned as slices of ``data``.
+    """
+    tag = data[offset]
+    offset += 1
+    if tag == ord('N'):
+        return None, offset
+    if tag == ord('T'):
+        return True, offset
+    if tag == ord('F'):
+        return False, offset
+    if tag == ord('I'):
+        length = data[offset]
+        offset += 1
+        return int.from_bytes(data[offset:offset + length], 'little', signed=True), offset + length
+    if tag == ord('D'):
+        return FLOAT.unpack_from(data, offset)[0], offset + FLOAT.size
+
+    length, = LENGTH.unpack_from(data, offset)
+    offset += LENGTH.size
+    if tag == ord('B'):
+        return data[offset:offset + length], offset + length
+    if tag == ord('S'):
+        return str(data[offset:offset + length], 'utf-8'), offset + length
+    if tag == ord('L'):
+        items = []
+        for _ in range(length):
+            item, offset = decode_from(data, offset)
+            items.append(item)
+        return items, offset
+    if tag == ord('M'):
+        mapping = {}
+        for _ in range(length):
+            key, offset = decode_from(data, offset)
+            mapping[key], offset = decode_from(data, offset)
+        return mapping, offset
+    raise ValueError(f"Unknown tag {chr(tag)!r}")
+
+
+class VectorWriter:
+    """
+    Writes a container to the binary ``stream``, with the calls of ``YAMLEmitter`` but without
+    their stream: the top level sequences of test cases become sections of records, and the
+    other top level entries go to the header. ``converters`` turns values of other types into
+    encodable values.
+    """
+
+    def __init__(self,
+                 stream: BinaryIO,
+                 converters: Optional[Dict[type, Callable[[Any], Any]]] = None) -> None:
+        self.stream = stream
+        self.converters = converters or {}
+        self.entries: Dict[Any, Any] = {}
+        self.sections: List[List[Any]] = []
+        self.offsets: List[int] = []
+        self.offset = 0
+
+    def __enter__(self) -> 'VectorWriter':
+        self.write(MAGIC + struct.pack('<I', VERSION))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+
+    def write(self, data: bytes) -> None:
+        self.stream.write(data)
+        self.offset += len(data)
+
+    def write_record(self, value: Any) -> None:
+        data = encode(value, self.converters)
+        self.offsets.append(self.offset)
+        self.write(LENGTH.pack(len(data)) + data)
+
+    def dump(self, data: Mapping[Any, Any]) -> None:
+        for key, value in data.items():
+            if isinstance(value, (list, tuple)):
+                self.dump_sequence(key, value)
+            else:
+                self.entries[key] = value
+
+    def dump_sequence(self, key: Any, items: Iterable[Any]) -> None:
+        first = len(self.offsets)
+        for item in items:
+            self.write_record(item)
+        self.sections.append([key, first, len(self.offsets) - first])
+
+    def close(self) -> None:
+        """
+        Write the header, the index and the footer.
+        """
+        case_count = len(self.offsets)
+        self.write_record({'entries': self.entries, 'sections': self.sections})
+        header_offset = self.offsets.pop()
+        index_offset = self.offset
+        self.write(struct.pack(f'<{case_count}Q', *self.offsets))
+        self.write(FOOTER.pack(header_offset, index_offset, case_count, MAGIC))
+
+
+class VectorReader:
+    """
+    Reads a container from its mmapped file, without copying the records.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self.mmap)
+        if bytes(self.data[:4]) != MAGIC:
+            raise ValueError("Not a test vector container")
+        header_offset, index_offset, self.case_count, magic = FOOTER.unpack_from(
+            self.data, len(self.data) - FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError("Truncated test vector container")
+        index = self.data[index_offset:index_offset + 8 * self.case_count]
+        if sys.byteorder == 'little':
+            self.index = index.cast('Q')
+        else:
+            self.index = struct.unpack(f'<{self.case_count}Q', index)
+        self.header = copy_bytes(self.decode_record(header_offset))
+        self.entries = self.header['entries']
+        self.sections = {
+            name: range(first, first + count) for name, first, count in self.header['sections']
+        }
+
+    def __len__(self) -> int:
+        return self.case_count
+
+    def get_record(self, n: int) -> memoryview:
+        """
+        Return the encoded test case ``n``.
+        """
+        offset = self.index[n]
+        length, = LENGTH.unpack_from(self.data, offset)
+        return self.data[offset + LENGTH.size:offset + LENGTH.size + length]
+
+    def decode_record(self, offset: int) -> Any:
+        length, = LENGTH.unpack_from(self.data, offset)
+        value, end = decode_from(self.data, offset + LENGTH.size)
+        if end != offset + LENGTH.size + length:
+            raise ValueError("Trailing data in record")
+        return value
+
+    def __getitem__(self, n: int) -> Any:
+        return self.decode_record(self.index[n])
+
+    def close(self) -> None:
+        """
+        Unmap the file, once the decoded test cases are not used anymore.
+        """
+        if isinstance(self.index, memoryview):
+            self.index.release()
+        self.data.release()
+        self.mmap.close()
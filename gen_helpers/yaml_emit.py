@@ -0,0 +1,397 @@
+"""
+Fast YAML emission shared by the generators.
+
+Generated files are a top level block mapping whose values are mostly long sequences of test
+cases. ``YAMLEmitter`` dumps such a mapping one unit at a time (a top level entry, or an item of
+a top level sequence):
+
+* ``FastYAMLWriter`` writes the units made of the scalars and collections of test cases
+  directly, laid out exactly as the PyYAML emitter (and the ruamel emitter, its port) lays them
+  out, line folding of flow collections included.
+* Any other unit is dumped by the YAML library of the generator, with the libyaml based
+  ``CDumper`` of PyYAML where it is available.
+
+In verification mode, every unit is also dumped by the pure Python emitter the generators used
+before, and both are parsed back and compared, so that the output is proven to load as the
+same documents.
+"""
+import io
+import re
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, TextIO, Tuple
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+try:
+    import ruamel.yaml as ruamel_yaml
+except ImportError:
+    ruamel_yaml = None
+
+BEST_WIDTH = 80
+BEST_INDENT = 2
+
+# Strings that resolve to integers, so that they are single quoted, under both YAML 1.1
+# (PyYAML) and YAML 1.2 (ruamel) rules
+QUOTED_STRING = re.compile(r'0|[1-9][0-9]*|0x[0-9a-fA-F]+')
+# Strings that are emitted as plain scalars, unless they are reserved words
+PLAIN_STRING = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|0x')
+# Plain scalars that YAML 1.1 resolves to booleans or null
+RESERVED_WORDS = {
+    'yes', 'Yes', 'YES', 'no', 'No', 'NO',
+    'true', 'True', 'TRUE', 'false', 'False', 'FALSE',
+    'on', 'On', 'ON', 'off', 'Off', 'OFF',
+    'null', 'Null', 'NULL',
+}
+
+COLLECTION_TYPES = (dict, list, tuple)
+
+
+class UnsupportedValue(Exception):
+    """
+    Raised by ``FastYAMLWriter`` for values it does not know how to lay out
+    """
+
+
+class YAMLVerificationError(ValueError):
+    pass
+
+
+def format_scalar(value: Any) -> str:
+    """
+    Return ``value`` as the emitters write it in a plain or single quoted scalar.
+    """
+    value_type = type(value)
+    if value_type is str:
+        if QUOTED_STRING.fullmatch(value):
+            return f"'{value}'"
+        if PLAIN_STRING.fullmatch(value) and value not in RESERVED_WORDS:
+            return value
+        if not value:
+            return "''"
+    elif value_type is bool:
+        return 'true' if value else 'false'
+    elif value_type is int:
+        return str(value)
+    raise UnsupportedValue(f"Cannot write {value_type.__name__} value {value!r}")
+
+
+def sort_items(mapping: Mapping[Any, Any]) -> List[Tuple[Any, Any]]:
+    # Same as the PyYAML representer
+    items = list(mapping.items())
+    try:
+        return sorted(items)
+    except TypeError:
+        return items
+
+
+class FastYAMLWriter:
+    """
+    Writes block and flow collections of scalars with the same indentation, spacing and line
+    breaks as the PyYAML emitter.
+
+    ``flow_leaves`` lays out the collections of scalars in flow style, as ``yaml.dump`` with
+    ``default_flow_style=None`` does. ``converters`` turns values of other types into
+    collections before they are written.
+    """
+
+    def __init__(self,
+                 sort_keys: bool = True,
+                 flow_leaves: bool = True,
+                 converters: Optional[Dict[type, Callable[[Any], Any]]] = None) -> None:
+        self.sort_keys = sort_keys
+        self.flow_leaves = flow_leaves
+        self.converters = converters or {}
+        self.pieces: List[str] = []
+        self.column = 0
+        self.whitespace = True
+        self.indention = True
+
+    def dump_item(self, item: Any) -> str:
+        """
+        Return ``item`` written as an item of a top level block sequence.
+        """
+        return self.dump_units([item], sequence=True)
+
+    def dump_entry(self, key: Any, value: Any) -> str:
+        """
+        Return ``key: value`` written as an entry of a top level block mapping.
+        """
+        return self.dump_units([(key, value)], sequence=False)
+
+    def dump_units(self, units: Sequence[Any], sequence: bool) -> str:
+        self.pieces = []
+        self.column = 0
+        self.whitespace = True
+        self.indention = True
+        if sequence:
+            self.write_block_sequence(units, None, mapping_context=False)
+        else:
+            self.write_block_mapping(units, None)
+        self.pieces.append('\n')
+        return ''.join(self.pieces)
+
+    def convert(self, value: Any) -> Any:
+        converter = self.converters.get(type(value))
+        return value if converter is None else converter(value)
+
+    def is_flow(self, value: Any) -> bool:
+        if not value:
+            return True
+        if not self.flow_leaves:
+            return False
+        if isinstance(value, dict):
+            value = value.values()
+        return not any(isinstance(self.convert(item), COLLECTION_TYPES) for item in value)
+
+    # The methods below follow ``yaml.emitter.Emitter``
+
+    def write_indicator(self, indicator: str, need_whitespace: bool,
+                        whitespace: bool = False, indention: bool = False) -> None:
+        if not self.whitespace and need_whitespace:
+            indicator = ' ' + indicator
+        self.whitespace = whitespace
+        self.indention = self.indention and indention
+        self.column += len(indicator)
+        self.pieces.append(indicator)
+
+    def write_indent(self, indent: int) -> None:
+        if not self.indention or self.column > indent or (self.column == indent and not self.whitespace):
+            self.pieces.append('\n')
+            self.column = 0
+            self.indention = True
+        if self.column < indent:
+            self.pieces.append(' ' * (indent - self.column))
+            self.column = indent
+        self.whitespace = True
+
+    def write_scalar(self, value: Any) -> None:
+        data = format_scalar(value)
+        if not self.whitespace:
+            data = ' ' + data
+        self.column += len(data)
+        self.pieces.append(data)
+        self.whitespace = False
+        self.indention = False
+
+    def write_node(self, value: Any, indent: Optional[int], mapping_context: bool) -> None:
+        value = self.convert(value)
+        if not isinstance(value, COLLECTION_TYPES):
+            self.write_scalar(value)
+        elif self.is_flow(value):
+            flow_indent = BEST_INDENT if indent is None else indent + BEST_INDENT
+            if isinstance(value, dict):
+                self.write_flow_mapping(self.get_items(value), flow_indent)
+            else:
+                self.write_flow_sequence(value, flow_indent)
+        elif isinstance(value, dict):
+            self.write_block_mapping(self.get_items(value), indent)
+        else:
+            self.write_block_sequence(value, indent, mapping_context)
+
+    def get_items(self, mapping: Mapping[Any, Any]) -> List[Tuple[Any, Any]]:
+        return sort_items(mapping) if self.sort_keys else list(mapping.items())
+
+    def write_block_sequence(self, items: Sequence[Any], indent: Optional[int],
+                             mapping_context: bool) -> None:
+        if indent is None:
+            indent = 0
+        elif not (mapping_context and not self.indention):
+            indent += BEST_INDENT
+        for item in items:
+            self.write_indent(indent)
+            self.write_indicator('-', True, indention=True)
+            self.write_node(item, indent, mapping_context=False)
+
+    def write_block_mapping(self, items: Sequence[Tuple[Any, Any]], indent: Optional[int]) -> None:
+        indent = 0 if indent is None else indent + BEST_INDENT
+        for key, value in items:
+            self.write_indent(indent)
+            self.write_scalar(key)
+            self.write_indicator(':', False)
+            self.write_node(value, indent, mapping_context=True)
+
+    def write_flow_sequence(self, items: Sequence[Any], indent: int) -> None:
+        self.write_indicator('[', True, whitespace=True)
+        for index, item in enumerate(items):
+            if index:
+                self.write_indicator(',', False)
+            if self.column > BEST_WIDTH:
+                self.write_indent(indent)
+            self.write_scalar(item)
+        self.write_indicator(']', False)
+
+    def write_flow_mapping(self, items: Sequence[Tuple[Any, Any]], indent: int) -> None:
+        self.write_indicator('{', True, whitespace=True)
+        for index, (key, value) in enumerate(items):
+            if index:
+                self.write_indicator(',', False)
+            if self.column > BEST_WIDTH:
+                self.write_indent(indent)
+            self.write_scalar(key)
+            self.write_indicator(':', False)
+            self.write_scalar(value)
+        self.write_indicator('}', False)
+
+
+class PyYAMLLibrary:
+    """
+    Dumps with PyYAML like ``yaml.dump(data, default_flow_style=default_flow_style)``, with
+    libyaml where it is available, and tuples and the types of ``converters`` dumped as the
+    collections they convert to.
+    """
+    sort_keys = True
+
+    def __init__(self,
+                 default_flow_style: Optional[bool] = None,
+                 converters: Optional[Dict[type, Callable[[Any], Any]]] = None) -> None:
+        if yaml is None:
+            raise ImportError("PyYAML is required")
+        self.default_flow_style = default_flow_style
+        self.flow_leaves = default_flow_style is None
+        self.converters = converters or {}
+        if getattr(yaml, '__with_libyaml__', False):
+            self.dumper = self.make_dumper(yaml.CDumper)
+            self.loader = yaml.CSafeLoader
+        else:
+            self.dumper = self.make_dumper(yaml.Dumper)
+            self.loader = yaml.SafeLoader
+        self.reference_dumper = self.make_dumper(yaml.Dumper)
+
+    def make_dumper(self, base: type) -> type:
+        # Test cases share objects, which are written in full instead of as YAML references
+        dumper = type(f'Generator{base.__name__}', (base,), {'ignore_aliases': lambda self, data: True})
+        dumper.add_representer(tuple, base.represent_list)
+        for value_type, converter in self.converters.items():
+            dumper.add_representer(
+                value_type,
+                lambda dumper, value, converter=converter: dumper.represent_data(converter(value)),
+            )
+        return dumper
+
+    def make_writer(self) -> FastYAMLWriter:
+        return FastYAMLWriter(
+            sort_keys=True,
+            flow_leaves=self.flow_leaves,
+            converters=self.converters,
+        )
+
+    def dump(self, data: Any, reference: bool = False) -> str:
+        # Collections of scalars at the top level are laid out in block style like the rest
+        # of the document, instead of being a flow collection of their own
+        children = data.values() if isinstance(data, dict) else data
+        top_level_flow = any(isinstance(child, COLLECTION_TYPES) for child in children)
+        return yaml.dump(
+            data,
+            Dumper=self.reference_dumper if reference else self.dumper,
+            default_flow_style=self.default_flow_style if top_level_flow else False,
+        )
+
+    def load(self, text: str) -> Any:
+        return yaml.load(text, Loader=self.loader)
+
+
+class RuamelLibrary:
+    """
+    Dumps with the round-trip dumper of ruamel, which has no libyaml based counterpart.
+    """
+    sort_keys = False
+    flow_leaves = False
+    converters: Dict[type, Callable[[Any], Any]] = {}
+
+    def __init__(self) -> None:
+        if ruamel_yaml is None:
+            raise ImportError("ruamel.yaml is required")
+        self.dumper = ruamel_yaml.YAML(pure=True)
+        self.dumper.representer.ignore_aliases = lambda data: True
+        self.loader = ruamel_yaml.YAML(typ='safe')
+
+    def make_writer(self) -> FastYAMLWriter:
+        return FastYAMLWriter(sort_keys=False, flow_leaves=False)
+
+    def dump(self, data: Any, reference: bool = False) -> str:
+        stream = io.StringIO()
+        self.dumper.dump(data, stream)
+        return stream.getvalue()
+
+    def load(self, text: str) -> Any:
+        return self.loader.load(text)
+
+
+class YAMLEmitter:
+    """
+    Dumps top level mappings with ``FastYAMLWriter`` where it can, and with ``library``
+    otherwise, or always with ``library`` if ``fast`` is not set.
+
+    With ``verify`` set, every unit is checked to parse to the same value as the output of the
+    pure Python emitter of ``library``, and ``YAMLVerificationError`` is raised if it does not.
+    """
+
+    def __init__(self, library: Any, fast: bool = True, verify: bool = False) -> None:
+        self.library = library
+        self.writer = library.make_writer() if fast else None
+        self.verify = verify
+        self.fast_units = 0
+        self.verified_units = 0
+        self.identical_units = 0
+
+    def dump(self, data: Mapping[Any, Any], stream: TextIO) -> None:
+        """
+        Write ``data`` like ``yaml.dump(data, stream)`` would.
+        """
+        items = sort_items(data) if self.library.sort_keys else list(data.items())
+        for key, value in items:
+            if self.is_block_sequence(value) and self.dump_sequence(key, value, stream):
+                continue
+            stream.write(self.dump_unit(key, {key: value}, lambda: self.writer.dump_entry(key, value)))
+
+    def dump_sequence(self, key: Any, items: Iterable[Any], stream: TextIO) -> bool:
+        """
+        Write the entry ``key`` of a top level mapping with the block sequence of ``items``,
+        one item at a time, so that ``items`` may be generated lazily.
+        Return ``False`` without writing anything if ``key`` has to be dumped with its value.
+        """
+        try:
+            stream.write(format_scalar(key) + ':\n')
+        except UnsupportedValue:
+            return False
+        for item in items:
+            stream.write(self.dump_unit(key, [item], lambda: self.writer.dump_item(item)))
+        return True
+
+    def is_block_sequence(self, value: Any) -> bool:
+        if not isinstance(value, (list, tuple)) or not value:
+            return False
+        if not self.library.flow_leaves:
+            return True
+        converters = self.library.converters
+        return any(
+            isinstance(converters.get(type(item), lambda item: item)(item), COLLECTION_TYPES)
+            for item in value
+        )
+
+    def dump_unit(self, key: Any, data: Any, write: Callable[[], str]) -> str:
+        text = None
+        if self.writer is not None:
+            try:
+                text = write()
+                self.fast_units += 1
+            except UnsupportedValue:
+                pass
+        if text is None:
+            text = self.library.dump(data)
+        if self.verify:
+            self.check(key, data, text)
+        return text
+
+    def check(self, key: Any, data: Any, text: str) -> None:
+        reference = self.library.dump(data, reference=True)
+        if self.library.load(text) != self.library.load(reference):
+            raise YAMLVerificationError(f"Output under {key!r} does not load as the reference output")
+        self.verified_units += 1
+        self.identical_units += text == reference
+
+    def report(self) -> str:
+        return (f"{self.verified_units} YAML units verified, "
+                f"{self.identical_units} identical to the reference emitter")
@@ -0,0 +1,238 @@
+"""
+Scalability benchmarks for the shuffling helpers
+Usage:
+    "python bench_shuffling.py -o report.json"
+    "python bench_shuffling.py -o report.json --compare baseline.json"
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import core_helpers
+from constants import FAR_FUTURE_EPOCH
+from core_helpers import (
+    get_active_validator_indices,
+    get_permuted_index,
+    get_round_pivot,
+    get_round_source_block,
+    get_shuffling,
+)
+from utils import hash_stats
+from yaml_objects import ValidatorRegistry
+
+EPOCH = 1000
+SEED = b'\xbe\xac' * 16
+VALIDATOR_COUNTS = [1, 16, 256, 4096, 65536, 2**20]
+# get_permuted_index is timed on at most this many indices of every validator count
+PERMUTED_INDEX_SAMPLE_SIZE = 256
+# Timings below this are too noisy to be compared against a baseline
+MIN_COMPARED_SECONDS = 0.001
+
+
+def make_registry(validator_count):
+    """
+    Return a registry in which every 8th validator is not active at ``EPOCH``
+    """
+    validators = ValidatorRegistry()
+    for idx in range(validator_count):
+        validators.append(
+            activation_epoch=FAR_FUTURE_EPOCH if idx % 8 == 7 else 0,
+            exit_epoch=FAR_FUTURE_EPOCH,
+            original_index=idx,
+        )
+    return validators
+
+
+def bench_get_permuted_index(validators):
+    list_size = len(validators)
+    step = max(1, list_size // PERMUTED_INDEX_SAMPLE_SIZE)
+    indices = range(0, list_size, step)
+    for index in indices:
+        get_permuted_index(index, list_size, SEED)
+    return len(indices)
+
+
+def bench_get_shuffling(validators):
+    get_shuffling(SEED, validators, EPOCH)
+    return len(validators)
+
+
+def bench_get_active_validator_indices(validators):
+    get_active_validator_indices(validators, EPOCH)
+    return len(validators)
+
+
+BENCHMARKS = {
+    'get_permuted_index': bench_get_permuted_index,
+    'get_shuffling': bench_get_shuffling,
+    'get_active_validator_indices': bench_get_active_validator_indices,
+}
+
+
+def clear_caches():
+    get_round_pivot.cache_clear()
+    get_round_source_block.cache_clear()
+
+
+def run_benchmark(name, validators, repeat, measure_memory):
+    """
+    Run benchmark ``name`` on ``validators`` and return its result record.
+    The wall time is the best of ``repeat`` runs, peak memory is measured in a separate run.
+    """
+    bench = BENCHMARKS[name]
+    seconds = None
+    for _ in range(repeat):
+        clear_caches()
+        with hash_stats() as stats:
+            start = time.perf_counter()
+            calls = bench(validators)
+            elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    peak_memory = None
+    if measure_memory:
+        clear_caches()
+        tracemalloc.start()
+        bench(validators)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'benchmark': name,
+        'validator_count': len(validators),
+        'calls': calls,
+        'seconds': seconds,
+        'hashes': stats.calls,
+        'hashes_per_validator': stats.calls / calls if calls else 0.0,
+        'peak_memory_bytes': peak_memory,
+    }
+
+
+def run_benchmarks(validator_counts, benchmarks, repeat, measure_memory):
+    results = []
+    for validator_count in validator_counts:
+        validators = make_registry(validator_count)
+        for name in benchmarks:
+            result = run_benchmark(name, validators, repeat, measure_memory)
+            print(format_result(result), file=sys.stderr)
+            results.append(result)
+    return results
+
+
+def format_result(result):
+    memory = result['peak_memory_bytes']
+    return (
+        f"{result['benchmark']:>28} {result['validator_count']:>8} validators: "
+        f"{result['seconds']:10.4f}s, {result['hashes_per_validator']:8.2f} hashes/validator"
+        + (f", peak {memory / 2**20:8.2f} MiB" if memory is not None else "")
+    )
+
+
+def find_regressions(results, baseline_results, tolerance):
+    """
+    Return a description of every result that is slower, or uses more memory, than its
+    baseline by more than ``tolerance`` (a fraction).
+    """
+    baseline = {
+        (result['benchmark'], result['validator_count']): result
+        for result in baseline_results
+    }
+    regressions = []
+    for result in results:
+        key = (result['benchmark'], result['validator_count'])
+        if key not in baseline:
+            continue
+
+        for field in ('seconds', 'peak_memory_bytes'):
+            value, baseline_value = result[field], baseline[key][field]
+            if value is None or not baseline_value:
+                continue
+            if field == 'seconds' and baseline_value < MIN_COMPARED_SECONDS:
+                continue
+            ratio = value / baseline_value
+            if ratio > 1 + tolerance:
+                regressions.append(
+                    f"{key[0]} with {key[1]} validators: {field} {baseline_value} -> {value}"
+                    f" ({ratio:.2f}x)"
+                )
+    return regressions
+
+
+parser = argparse.ArgumentParser(
+    prog="bench_shuffling",
+    description="Benchmark the shuffling helpers over increasing validator counts",
+)
+parser.add_argument(
+    "-o",
+    "--output",
+    help="path of the JSON report to write",
+)
+parser.add_argument(
+    "--compare",
+    help="JSON report of a previous run to compare against, regressions make the script fail",
+)
+parser.add_argument(
+    "--tolerance",
+    type=float,
+    default=0.2,
+    help="fraction by which a result may exceed its baseline before being flagged (default: %(default)s)",
+)
+parser.add_argument(
+    "--max-validators",
+    type=int,
+    default=VALIDATOR_COUNTS[-1],
+    help="largest validator count to benchmark (default: %(default)s)",
+)
+parser.add_argument(
+    "-b",
+    "--benchmark",
+    dest="benchmarks",
+    action="append",
+    choices=sorted(BENCHMARKS),
+    help="benchmark to run, can be repeated (default: all)",
+)
+parser.add_argument(
+    "--repeat",
+    type=int,
+    default=3,
+    help="number of timed runs of every benchmark, the fastest is reported (default: %(default)s)",
+)
+parser.add_argument(
+    "--no-memory",
+    action="store_true",
+    default=False,
+    help="skip the tracemalloc run measuring peak memory",
+)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    validator_counts = [count for count in VALIDATOR_COUNTS if count <= args.max_validators]
+    results = run_benchmarks(
+        validator_counts,
+        args.benchmarks or list(BENCHMARKS),
+        args.repeat,
+        not args.no_memory,
+    )
+    report = {
+        'python': platform.python_version(),
+        'backend': 'python' if core_helpers.np is None else 'numpy',
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline_report = json.load(f)
+        regressions = find_regressions(results, baseline_report['results'], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
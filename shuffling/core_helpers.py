@@ -1,10 +1,20 @@
-from typing import Any, List, NewType
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Any, Iterator, List, NewType, Optional, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 from constants import SLOTS_PER_EPOCH, SHARD_COUNT, TARGET_COMMITTEE_SIZE, SHUFFLE_ROUND_COUNT
-from utils import hash
-from yaml_objects import Validator
+from shuffle_cache import ShuffleCache
+from utils import hash, hash_many
+from yaml_objects import Validator, ValidatorRegistry
 
 Epoch = NewType("Epoch", int)
+Slot = NewType("Slot", int)
+Shard = NewType("Shard", int)
 ValidatorIndex = NewType("ValidatorIndex", int)
 Bytes32 = NewType("Bytes32", bytes)
 
@@ -28,10 +38,13 @@ def is_active_validator(validator: Validator, epoch: Epoch) -> bool:
     return validator.activation_epoch <= epoch < validator.exit_epoch
 
 
-def get_active_validator_indices(validators: List[Validator], epoch: Epoch) -> List[ValidatorIndex]:
+def get_active_validator_indices(validators: Union[List[Validator], ValidatorRegistry],
+                                 epoch: Epoch) -> List[ValidatorIndex]:
     """
     Get indices of active validators from ``validators``.
     """
+    if isinstance(validators, ValidatorRegistry):
+        return validators.get_active_validator_indices(epoch)
     return [i for i, v in enumerate(validators) if is_active_validator(v, epoch)]
 
 
@@ -79,17 +92,210 @@ def get_permuted_index(index: int, list_size: int, seed: Bytes32) -> int:
     return index
 
 
+@lru_cache(maxsize=2**16)
+def get_round_pivot(seed: Bytes32, round: int, list_size: int) -> int:
+    """
+    Return the pivot of ``round`` for a list of ``list_size`` items.
+    """
+    return bytes_to_int(hash(seed + int_to_bytes1(round))[0:8]) % list_size
+
+
+@lru_cache(maxsize=2**16)
+def get_round_source_block(seed: Bytes32, round: int, position_block: int) -> Bytes32:
+    """
+    Return the source hash of ``round`` covering positions ``256 * position_block`` onwards.
+    """
+    return hash(seed + int_to_bytes1(round) + int_to_bytes4(position_block))
+
+
+def get_round_source(seed: Bytes32, round: int, list_size: int) -> bytes:
+    """
+    Return the concatenated source hashes of ``round``, one per 256 positions of the list.
+    Bit ``position`` of the result decides whether ``position`` is swapped in ``round``.
+    """
+    return b''.join(hash_many([
+        seed + int_to_bytes1(round) + int_to_bytes4(position_block)
+        for position_block in range((list_size + 255) // 256)
+    ]))
+
+
+def get_unpermuted_index(index: int, list_size: int, seed: Bytes32) -> int:
+    """
+    Return `p^-1(index)` for the permutation `p` of ``get_permuted_index``, i.e. the position
+    that the item at ``index`` is moved to by ``get_permuted_list``.
+
+    Every round is an involution, so the inverse runs the rounds in reverse order. Round pivots
+    and source hashes are cached across calls.
+    """
+    for round in reversed(range(SHUFFLE_ROUND_COUNT)):
+        pivot = get_round_pivot(seed, round, list_size)
+        flip = (pivot - index) % list_size
+        position = max(index, flip)
+        source = get_round_source_block(seed, round, position // 256)
+        byte = source[(position % 256) // 8]
+        bit = (byte >> (position % 8)) % 2
+        index = flip if bit else index
+
+    return index
+
+
+def get_permuted_list(values: List[Any], seed: Bytes32) -> List[Any]:
+    """
+    Return ``values`` permuted so that the item at position ``i`` is ``values[get_permuted_index(i, ...)]``.
+
+    Shuffles the whole list at once: each round's pivot and source hashes are computed a single
+    time, instead of once per index as ``get_permuted_index`` does. Uses the NumPy backend when
+    NumPy is installed.
+    """
+    if np is not None:
+        return get_permuted_list_numpy(values, seed)
+    return get_permuted_list_python(values, seed)
+
+
+def get_permuted_list_python(values: List[Any], seed: Bytes32) -> List[Any]:
+    """
+    Pure Python backend of ``get_permuted_list``.
+
+    Every round of 'swap or not' is an involution, so running the rounds in reverse order and
+    swapping pairs in place yields the forward permutation.
+    """
+    list_size = len(values)
+    values = list(values)
+    if list_size <= 1:
+        return values
+
+    for round in reversed(range(SHUFFLE_ROUND_COUNT)):
+        pivot = get_round_pivot(seed, round, list_size)
+        source = get_round_source(seed, round, list_size)
+
+        # Pairs below the pivot: (i, pivot - i), decided by the bit at ``pivot - i``
+        for i in range((pivot + 1) // 2):
+            flip = pivot - i
+            if (source[flip >> 3] >> (flip & 7)) & 1:
+                values[i], values[flip] = values[flip], values[i]
+
+        # Pairs above the pivot: (i, pivot + list_size - i), decided by the bit at the larger one
+        for i in range(pivot + 1, (pivot + list_size + 1) // 2):
+            flip = pivot + list_size - i
+            if (source[flip >> 3] >> (flip & 7)) & 1:
+                values[i], values[flip] = values[flip], values[i]
+
+    return values
+
+
+def get_permuted_list_numpy(values: List[Any], seed: Bytes32) -> List[Any]:
+    """
+    NumPy backend of ``get_permuted_list``.
+
+    Follows ``get_permuted_index`` round by round, but for every index at once: flip, position
+    and bit extraction are uint64 array operations over the round's source bitfield.
+    """
+    list_size = len(values)
+    if list_size <= 1:
+        return list(values)
+
+    size = np.uint64(list_size)
+    indices = np.arange(list_size, dtype=np.uint64)
+    for round in range(SHUFFLE_ROUND_COUNT):
+        pivot = np.uint64(get_round_pivot(seed, round, list_size))
+        source = np.frombuffer(get_round_source(seed, round, list_size), dtype=np.uint8)
+        bits = np.unpackbits(source, bitorder='little')
+
+        flip = (pivot + size - indices) % size
+        position = np.maximum(indices, flip)
+        indices = np.where(bits[position], flip, indices)
+
+    return [values[i] for i in indices.tolist()]
+
+
 def get_shuffling(seed: Bytes32,
-                  validators: List[Validator],
-                  epoch: Epoch) -> List[List[ValidatorIndex]]:
+                  validators: Union[List[Validator], ValidatorRegistry],
+                  epoch: Epoch,
+                  cache: Optional[ShuffleCache] = None) -> List[List[ValidatorIndex]]:
     """
     Shuffle active validators and split into crosslink committees.
     Return a list of committees (each a list of validator indices).
+    If ``cache`` is given, the shuffled indices are looked up in and stored to it.
     """
-    # Shuffle active validator indices
     active_validator_indices = get_active_validator_indices(validators, epoch)
-    length = len(active_validator_indices)
-    shuffled_indices = [active_validator_indices[get_permuted_index(i, length, seed)] for i in range(length)]
+    return get_committees(seed, active_validator_indices, cache)
+
+
+def get_committees(seed: Bytes32,
+                   active_validator_indices: List[ValidatorIndex],
+                   cache: Optional[ShuffleCache] = None) -> List[List[ValidatorIndex]]:
+    """
+    Shuffle ``active_validator_indices`` and split them into crosslink committees.
+    """
+    # Shuffle active validator indices
+    if cache is None:
+        shuffled_indices = get_permuted_list(active_validator_indices, seed)
+    else:
+        key = cache.get_key(seed, active_validator_indices)
+        shuffled_indices = cache.get(key, len(active_validator_indices))
+        if shuffled_indices is None:
+            shuffled_indices = get_permuted_list(active_validator_indices, seed)
+            cache.set(key, shuffled_indices)
 
     # Split the shuffled active validator indices
-    return split(shuffled_indices, get_epoch_committee_count(length))
+    return split(shuffled_indices, get_epoch_committee_count(len(active_validator_indices)))
+
+
+def get_epoch_shufflings(seeds: List[Bytes32],
+                         validators: Union[List[Validator], ValidatorRegistry],
+                         start_epoch: Epoch,
+                         cache: Optional[ShuffleCache] = None) -> Iterator[List[List[ValidatorIndex]]]:
+    """
+    Yield the ``get_shuffling`` committees of the epochs starting at ``start_epoch``, using
+    ``seeds[i]`` as the seed of epoch ``start_epoch + i``.
+    The previous epoch's committees are reused when both its seed and active validators are unchanged.
+    """
+    previous_seed = None
+    previous_active_validator_indices = None
+    committees = None
+    for epoch, seed in enumerate(seeds, start_epoch):
+        active_validator_indices = get_active_validator_indices(validators, epoch)
+        if seed != previous_seed or active_validator_indices != previous_active_validator_indices:
+            committees = get_committees(seed, active_validator_indices, cache)
+            previous_seed = seed
+            previous_active_validator_indices = active_validator_indices
+        yield committees
+
+
+def get_crosslink_committees_at_slot(committees: List[List[ValidatorIndex]],
+                                     slot: Slot,
+                                     start_shard: Shard) -> List[Tuple[List[ValidatorIndex], Shard]]:
+    """
+    Return the ``(committee, shard)`` pairs of ``slot``, sliced out of the ``committees`` of its
+    epoch, whose first committee is assigned to ``start_shard``.
+    """
+    committees_per_slot = len(committees) // SLOTS_PER_EPOCH
+    offset = slot % SLOTS_PER_EPOCH
+    slot_start_shard = (start_shard + committees_per_slot * offset) % SHARD_COUNT
+    return [
+        (committees[committees_per_slot * offset + i], (slot_start_shard + i) % SHARD_COUNT)
+        for i in range(committees_per_slot)
+    ]
+
+
+def get_committee_assignment(validator_index: ValidatorIndex,
+                             active_validator_indices: List[ValidatorIndex],
+                             seed: Bytes32) -> Tuple[int, int]:
+    """
+    Return the ``(committee index, position in committee)`` of ``validator_index`` in the
+    ``get_shuffling`` output, without shuffling the other validators.
+    ``active_validator_indices`` must be sorted, as returned by ``get_active_validator_indices``.
+    """
+    active_index = bisect_left(active_validator_indices, validator_index)
+    if (active_index == len(active_validator_indices) or
+            active_validator_indices[active_index] != validator_index):
+        raise ValueError(f"Validator {validator_index} is not active")
+
+    length = len(active_validator_indices)
+    shuffled_position = get_unpermuted_index(active_index, length, seed)
+
+    # Inverse of the ``split`` boundaries: committee ``i`` starts at ``length * i // committee_count``
+    committee_count = get_epoch_committee_count(length)
+    committee_index = ((shuffled_position + 1) * committee_count - 1) // length
+    committee_start = length * committee_index // committee_count
+    return committee_index, shuffled_position - committee_start
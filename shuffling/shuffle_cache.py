@@ -0,0 +1,142 @@
+from array import array
+import hashlib
+import os
+import tempfile
+from typing import List, Optional, Tuple
+
+from constants import SHARD_COUNT, SHUFFLE_ROUND_COUNT, SLOTS_PER_EPOCH, TARGET_COMMITTEE_SIZE
+
+SHUFFLING_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(SHUFFLING_DIR, '.shuffle_cache')
+MAX_CACHE_BYTES = 2**28  # 256 MiB
+
+# Bump when the cached file format changes
+CACHE_VERSION = 1
+
+# Modules that compute the shufflings (``get_permuted_list``, ``get_round_pivot``, the hash
+# function), their digest is part of every key so that a fix to the shuffling is never served
+# stale permutations
+SOURCE_FILES = [os.path.join(SHUFFLING_DIR, name) for name in ('core_helpers.py', 'utils.py')]
+
+
+def get_source_digest() -> bytes:
+    digest = hashlib.sha256()
+    for path in SOURCE_FILES:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.digest()
+
+
+SOURCE_DIGEST = get_source_digest()
+
+
+class ShuffleCache:
+    """
+    An on-disk cache of shuffled active validator indices.
+
+    Entries are keyed by a digest of the seed, the active validator indices, the constants the
+    shuffling depends on and the source of the shuffling, and stored as one uint64 array file
+    per entry. Reads refresh the modification time of an entry, and the least recently used
+    entries are evicted once the cache exceeds ``max_bytes``. The size of the cache is counted
+    from one scan of the directory, so that stores do not scan it again until the count exceeds
+    ``max_bytes``. Entries are written atomically, so the cache can be shared by concurrent
+    worker processes.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes: Optional[int] = None
+
+    @staticmethod
+    def get_key(seed: bytes, active_validator_indices: List[int]) -> str:
+        digest = hashlib.sha256()
+        digest.update(array('Q', [
+            CACHE_VERSION,
+            SHUFFLE_ROUND_COUNT,
+            SHARD_COUNT,
+            SLOTS_PER_EPOCH,
+            TARGET_COMMITTEE_SIZE,
+            len(seed),
+        ]).tobytes())
+        digest.update(SOURCE_DIGEST)
+        digest.update(seed)
+        digest.update(array('Q', active_validator_indices).tobytes())
+        return digest.hexdigest()
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.bin')
+
+    def get(self, key: str, count: int) -> Optional[List[int]]:
+        """
+        Return the ``count`` shuffled indices stored under ``key``, or ``None`` on a miss.
+        An entry of another size (truncated or partially written) is deleted, and is a miss.
+        """
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        shuffled_indices = array('Q')
+        try:
+            if len(data) != shuffled_indices.itemsize * count:
+                raise ValueError(f"Expected {count} shuffled indices, got {len(data)} bytes")
+            shuffled_indices.frombytes(data)
+        except ValueError:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        return shuffled_indices.tolist()
+
+    def set(self, key: str, shuffled_indices: List[int]) -> None:
+        """
+        Store ``shuffled_indices`` under ``key`` and evict old entries if needed.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        data = array('Q', shuffled_indices).tobytes()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.get_path(key))
+        if self.total_bytes is None:
+            self.total_bytes = sum(size for _, size, _ in self.scan())
+        else:
+            self.total_bytes += len(data)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def scan(self) -> List[Tuple[float, int, str]]:
+        """
+        Return the modification time, size and path of every entry.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.bin'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self) -> None:
+        """
+        Delete the least recently used entries until the cache fits into ``max_bytes``.
+        """
+        entries = self.scan()
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+        self.total_bytes = total_bytes
@@ -1,12 +1,28 @@
-import random
+import argparse
 import sys
 import os
 
 import yaml
 
-from constants import ACTIVATION_EXIT_DELAY, FAR_FUTURE_EPOCH
-from core_helpers import get_shuffling
-from yaml_objects import Validator
+from constants import ACTIVATION_EXIT_DELAY, FAR_FUTURE_EPOCH, SHARD_COUNT, SLOTS_PER_EPOCH
+from core_helpers import (
+    get_crosslink_committees_at_slot,
+    get_epoch_shufflings,
+    get_round_pivot,
+    get_round_source_block,
+    get_shuffling,
+)
+from shuffle_cache import CACHE_DIR, ShuffleCache
+from utils import hash_stats
+from yaml_objects import ValidatorRegistry
+
+# Shared generator helpers live at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from gen_helpers.compression import COMPRESSIONS  # noqa: E402
+from gen_helpers.entropy import Entropy, get_case_streams, named_stream  # noqa: E402
+from gen_helpers.parallel import map_cases  # noqa: E402
+from gen_helpers.output import open_output  # noqa: E402
+from gen_helpers.yaml_emit import PyYAMLLibrary, YAMLEmitter  # noqa: E402
 
 
 def noop(self, *args, **kw):
@@ -24,9 +40,44 @@ EPOCH = 1000  # The epoch, also a mean for the normal distribution
 # shuffling
 RAND_EPOCH_STD = 35
 MAX_EXIT_EPOCH = 5000  # Maximum exit_epoch for easier reading
+MULTI_EPOCH_COUNT = 8  # Number of consecutive epochs of the multi epoch committee cases
 
 
-def active_exited_validators_generator():
+SEED = int("0xEF00BEAC", 16)
+
+
+def profile_case(make_case, *args):
+    """
+    Return ``make_case(*args)`` together with the hash statistics of the call, which also
+    counts the round hashes cached by earlier cases
+    """
+    get_round_pivot.cache_clear()
+    get_round_source_block.cache_clear()
+    with hash_stats() as stats:
+        case = make_case(*args)
+    return case, stats
+
+
+def generate_cases(make_case, arguments, workers=None, profile=False):
+    """
+    Yield ``make_case(*args)`` for every ``args`` in ``arguments``, see ``map_cases``.
+    If ``profile`` is set, the hash statistics of every case are printed to stderr.
+    """
+    if not profile:
+        yield from map_cases(make_case, arguments, workers)
+        return
+
+    profiled_arguments = [(make_case,) + tuple(args) for args in arguments]
+    for index, (case, stats) in enumerate(map_cases(profile_case, profiled_arguments, workers)):
+        validator_count = len(case['input']['validators'])
+        print(
+            f'{make_case.__name__} #{index}: {validator_count} validators, {stats}',
+            file=sys.stderr,
+        )
+        yield case
+
+
+def active_exited_validators_generator(workers=None, profile=False, cache=None, compat=False):
     """
     Random cases with variety of validator's activity status
     """
@@ -39,67 +90,85 @@ def active_exited_validators_generator():
         'fork': 'phase0-0.5.0',
     }
 
+    return {
+        'metadata': metadata,
+        'filename': 'test_vector_shuffling.yml',
+        'test_cases': active_exited_validators_test_cases(workers, profile, cache, compat),
+    }
+
+
+def active_exited_validators_test_cases(workers=None, profile=False, cache=None, compat=False):
+    """
+    Yield the test cases of ``active_exited_validators_generator`` one at a time, computed on
+    ``workers`` processes if set.
+    Every case draws from its own stream, see ``get_case_streams`` for ``compat``.
+    """
     # Config
-    random.seed(int("0xEF00BEAC", 16))
     num_cases = 10
 
-    test_cases = []
-
-    for case in range(num_cases):
-        seedhash = bytes(random.randint(0, 255) for byte in range(32))
-        idx_max = random.randint(128, 512)
-
-        validators = []
-        for idx in range(idx_max):
-            v = Validator(original_index=idx)
-            # 4/5 of all validators are active
-            if random.random() < 0.8:
-                # Choose a normally distributed epoch number
-                rand_epoch = round(random.gauss(EPOCH, RAND_EPOCH_STD))
-
-                # for 1/2 of *active* validators rand_epoch is the activation epoch
-                if random.random() < 0.5:
-                    v.activation_epoch = rand_epoch
-
-                    # 1/4 of active validators will exit in forseeable future
-                    if random.random() < 0.5:
-                        v.exit_epoch = random.randint(
-                            rand_epoch + ACTIVATION_EXIT_DELAY + 1, MAX_EXIT_EPOCH)
-                    # 1/4 of active validators in theory remain in the set indefinitely
-                    else:
-                        v.exit_epoch = FAR_FUTURE_EPOCH
-                # for the other active 1/2 rand_epoch is the exit epoch
-                else:
-                    v.activation_epoch = random.randint(
-                        0, rand_epoch - ACTIVATION_EXIT_DELAY)
-                    v.exit_epoch = rand_epoch
+    arguments = [
+        (rng, cache)
+        for rng in get_case_streams(SEED, 'active_exited_validators', num_cases, workers, compat)
+    ]
 
-            # The remaining 1/5 of all validators is not activated
-            else:
-                v.activation_epoch = FAR_FUTURE_EPOCH
-                v.exit_epoch = FAR_FUTURE_EPOCH
+    yield from generate_cases(make_active_exited_validators_case, arguments, workers, profile)
 
-            validators.append(v)
 
-        input_ = {
-            'validators': validators,
-            'epoch': EPOCH
-        }
-        output = get_shuffling(
-            seedhash, validators, input_['epoch'])
-
-        test_cases.append({
-            'seed': '0x' + seedhash.hex(), 'input': input_, 'output': output
-        })
+def make_active_exited_validators_case(rng, cache=None):
+    """
+    Build one test case of ``active_exited_validators_generator``, drawing from ``rng``
+    """
+    seedhash = rng.random_bytes(32)
+    idx_max = rng.randint(128, 512)
+
+    validators = ValidatorRegistry()
+    for idx in range(idx_max):
+        # 4/5 of all validators are active
+        if rng.random() < 0.8:
+            # Choose a normally distributed epoch number
+            rand_epoch = round(rng.gauss(EPOCH, RAND_EPOCH_STD))
+
+            # for 1/2 of *active* validators rand_epoch is the activation epoch
+            if rng.random() < 0.5:
+                activation_epoch = rand_epoch
+
+                # 1/4 of active validators will exit in forseeable future
+                if rng.random() < 0.5:
+                    exit_epoch = rng.randint(
+                        rand_epoch + ACTIVATION_EXIT_DELAY + 1, MAX_EXIT_EPOCH)
+                # 1/4 of active validators in theory remain in the set indefinitely
+                else:
+                    exit_epoch = FAR_FUTURE_EPOCH
+            # for the other active 1/2 rand_epoch is the exit epoch
+            else:
+                activation_epoch = rng.randint(
+                    0, rand_epoch - ACTIVATION_EXIT_DELAY)
+                exit_epoch = rand_epoch
+
+        # The remaining 1/5 of all validators is not activated
+        else:
+            activation_epoch = FAR_FUTURE_EPOCH
+            exit_epoch = FAR_FUTURE_EPOCH
+
+        validators.append(
+            activation_epoch=activation_epoch,
+            exit_epoch=exit_epoch,
+            original_index=idx,
+        )
+
+    input_ = {
+        'validators': validators,
+        'epoch': EPOCH
+    }
+    output = get_shuffling(
+        seedhash, validators, input_['epoch'], cache)
 
     return {
-        'metadata': metadata,
-        'filename': 'test_vector_shuffling.yml',
-        'test_cases': test_cases
+        'seed': '0x' + seedhash.hex(), 'input': input_, 'output': output
     }
 
 
-def validators_set_size_variety_generator():
+def validators_set_size_variety_generator(workers=None, profile=False, cache=None, compat=False):
     """
     Different validator set size cases, inspired by removed manual `permutated_index` tests
     https://github.com/ethereum/eth2.0-test-generators/tree/bcd9ab2933d9f696901d1dfda0828061e9d3093f/permutated_index
@@ -114,47 +183,273 @@ def validators_set_size_variety_generator():
         'version': 1.0
     }
 
-    # Config
-    random.seed(int("0xEF00BEAC", 16))
+    return {
+        'metadata': metadata,
+        'filename': 'shuffling_set_size.yml',
+        'test_cases': validators_set_size_variety_test_cases(workers, profile, cache, compat),
+    }
 
-    test_cases = []
 
-    seedhash = bytes(random.randint(0, 255) for byte in range(32))
+def validators_set_size_variety_test_cases(workers=None, profile=False, cache=None, compat=False):
+    """
+    Yield the test cases of ``validators_set_size_variety_generator`` one at a time.
+    All cases share one seed, so the output does not depend on ``workers``.
+    """
+    # Config
+    rng = Entropy(SEED, compat=True) if compat else named_stream(SEED, 'validators_set_size_variety')
+
+    seedhash = rng.random_bytes(32)
     idx_max = 4096
     set_sizes = [1, 2, 3, 1024, idx_max]
 
-    for size in set_sizes:
-        validators = []
-        for idx in range(size):
-            v = Validator(original_index=idx)
-            v.activation_epoch = EPOCH
-            v.exit_epoch = FAR_FUTURE_EPOCH
-            validators.append(v)
-        input_ = {
-            'validators': validators,
-            'epoch': EPOCH
-        }
-        output = get_shuffling(
-            seedhash, validators, input_['epoch'])
+    yield from generate_cases(
+        make_validators_set_size_case,
+        [(seedhash, size, cache) for size in set_sizes],
+        workers,
+        profile,
+    )
+
+
+def make_validators_set_size_case(seedhash, size, cache=None):
+    """
+    Build one test case of ``validators_set_size_variety_generator`` with ``size`` validators
+    """
+    validators = ValidatorRegistry()
+    for idx in range(size):
+        validators.append(
+            activation_epoch=EPOCH,
+            exit_epoch=FAR_FUTURE_EPOCH,
+            original_index=idx,
+        )
+    input_ = {
+        'validators': validators,
+        'epoch': EPOCH
+    }
+    output = get_shuffling(
+        seedhash, validators, input_['epoch'], cache)
+
+    return {
+        'seed': '0x' + seedhash.hex(), 'input': input_, 'output': output
+    }
 
-        test_cases.append({
-            'seed': '0x' + seedhash.hex(), 'input': input_, 'output': output
-        })
+
+def multi_epoch_committees_generator(workers=None, profile=False, cache=None, compat=False):
+    """
+    Crosslink committees of every slot and shard over consecutive epochs, with seeds and
+    active validators changing between some of the epochs
+    """
+    # Order not preserved - https://github.com/yaml/pyyaml/issues/110
+    metadata = {
+        'title': 'Shuffling Algorithm Tests 3',
+        'summary': 'Test vectors for crosslink committees of every slot over consecutive epochs.'
+                   ' Epoch start_epoch + i is shuffled with seeds[i], and its first committee is assigned'
+                   ' to the start shard of the previous epoch plus its committee count, modulo SHARD_COUNT.'
+                   ' Note: only relevant validator fields are defined.',
+        'test_suite': 'shuffle',
+        'fork': 'phase0-0.5.0',
+    }
 
     return {
         'metadata': metadata,
-        'filename': 'shuffling_set_size.yml',
-        'test_cases': test_cases
+        'filename': 'shuffling_multi_epoch.yml',
+        'test_cases': multi_epoch_committees_test_cases(workers, profile, cache, compat),
+    }
+
+
+def multi_epoch_committees_test_cases(workers=None, profile=False, cache=None, compat=False):
+    """
+    Yield the test cases of ``multi_epoch_committees_generator`` one at a time, see
+    ``active_exited_validators_test_cases`` for ``workers`` and ``compat``.
+    """
+    # Config
+    validator_counts = [128, 4096, 16384]
+
+    streams = get_case_streams(
+        SEED, 'multi_epoch_committees', len(validator_counts), workers, compat)
+    arguments = [(rng, count, cache) for rng, count in zip(streams, validator_counts)]
+
+    yield from generate_cases(make_multi_epoch_committees_case, arguments, workers, profile)
+
+
+def make_multi_epoch_committees_case(rng, validator_count, cache=None):
+    """
+    Build one test case of ``multi_epoch_committees_generator`` with ``validator_count``
+    validators, drawing from ``rng``
+    """
+    end_epoch = EPOCH + MULTI_EPOCH_COUNT
+    # The active validators only change in two of the epochs
+    update_epochs = sorted(rng.sample(range(EPOCH + 1, end_epoch), 2))
+
+    validators = ValidatorRegistry()
+    for idx in range(validator_count):
+        # 3/4 of all validators are active from the first epoch, the others activate on the way
+        if rng.random() < 0.75:
+            activation_epoch = rng.randint(0, EPOCH)
+        else:
+            activation_epoch = rng.choice(update_epochs)
+
+        # 1/8 of all validators exit on the way
+        exit_epochs = [epoch for epoch in update_epochs if epoch > activation_epoch]
+        if exit_epochs and rng.random() < 0.125:
+            exit_epoch = rng.choice(exit_epochs)
+        else:
+            exit_epoch = FAR_FUTURE_EPOCH
+
+        validators.append(
+            activation_epoch=activation_epoch,
+            exit_epoch=exit_epoch,
+            original_index=idx,
+        )
+
+    # The seed changes in about half of the epochs
+    seeds = []
+    for epoch in range(EPOCH, end_epoch):
+        if not seeds or rng.random() < 0.5:
+            seedhash = rng.random_bytes(32)
+        seeds.append(seedhash)
+    start_shard = rng.randrange(SHARD_COUNT)
+
+    output = []
+    epoch_start_shard = start_shard
+    for epoch, committees in enumerate(get_epoch_shufflings(seeds, validators, EPOCH, cache), EPOCH):
+        for slot in range(epoch * SLOTS_PER_EPOCH, (epoch + 1) * SLOTS_PER_EPOCH):
+            output.append({
+                'slot': slot,
+                'crosslink_committees': [
+                    {'shard': shard, 'committee': committee}
+                    for committee, shard in get_crosslink_committees_at_slot(
+                        committees, slot, epoch_start_shard)
+                ],
+            })
+        epoch_start_shard = (epoch_start_shard + len(committees)) % SHARD_COUNT
+
+    return {
+        'seeds': ['0x' + seedhash.hex() for seedhash in seeds],
+        'input': {
+            'validators': validators,
+            'start_epoch': EPOCH,
+            'start_shard': start_shard,
+        },
+        'output': output,
     }
 
 
+# Validator registries are dumped and encoded as lists of ``Validator`` field mappings
+YAML_CONVERTERS = {ValidatorRegistry: lambda registry: list(registry.to_mappings())}
+
+
+parser = argparse.ArgumentParser(
+    prog="tgen_shuffling",
+    description="Generate YAML test files for validator shuffling",
+)
+parser.add_argument(
+    "output_dir",
+    help="directory into which the generated YAML files will be dumped",
+)
+parser.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    default=None,
+    help="generate the test cases on this many processes, the output is the same for any "
+         "number of workers",
+)
+parser.add_argument(
+    "-p",
+    "--profile",
+    action="store_true",
+    default=False,
+    help="print the number of hashes, bytes hashed and hashing time of every test case",
+)
+parser.add_argument(
+    "--cache-dir",
+    default=CACHE_DIR,
+    help="directory of the persistent shuffle cache (default: %(default)s)",
+)
+parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    default=False,
+    help="always compute the shuffling instead of using the persistent shuffle cache",
+)
+parser.add_argument(
+    "--compat-entropy",
+    action="store_true",
+    default=False,
+    help="draw random values one at a time from the global seeded stream (or from one seed per "
+         "test case with --workers), reproducing the output of previous versions",
+)
+parser.add_argument(
+    "--format",
+    choices=["yaml", "binary"],
+    default="yaml",
+    help="write YAML files, or binary test vector containers (.bin) with an index of the test "
+         "cases (default: %(default)s)",
+)
+parser.add_argument(
+    "--chunk-size",
+    type=int,
+    default=None,
+    help="split the test cases into files of this many test cases, listed in a manifest",
+)
+parser.add_argument(
+    "--compress",
+    choices=COMPRESSIONS,
+    default=None,
+    help="compress the output files while they are written, and write the digest of every "
+         "compressed file to a .sha256 sidecar",
+)
+parser.add_argument(
+    "--compress-level",
+    type=int,
+    default=None,
+    help="compression level, 1-9 (0-9 for xz, default: the default level of the compression)",
+)
+parser.add_argument(
+    "--yaml-emitter",
+    choices=["fast", "library"],
+    default="fast",
+    help="write the test cases directly (fast), or always with the YAML library (default: "
+         "%(default)s)",
+)
+parser.add_argument(
+    "--verify-yaml",
+    action="store_true",
+    default=False,
+    help="check that the output loads as the same documents as the output of the pure Python "
+         "emitter",
+)
+
+
 if __name__ == '__main__':
-    output_dir = sys.argv[1]
-    for generator in [active_exited_validators_generator, validators_set_size_variety_generator]:
-        result = generator()
-        filename = os.path.join(output_dir, result['filename'])
-        with open(filename, 'w') as outfile:
+    args = parser.parse_args()
+    cache = None if args.no_cache else ShuffleCache(args.cache_dir)
+    generators = [
+        active_exited_validators_generator,
+        validators_set_size_variety_generator,
+        multi_epoch_committees_generator,
+    ]
+    # Flow style keeps each "ValidatorRecord" and "committee" on one line, default_flow_style=False
+    # would unravel them, exploding file size
+    emitter = YAMLEmitter(
+        PyYAMLLibrary(default_flow_style=None, converters=YAML_CONVERTERS),
+        fast=args.yaml_emitter == 'fast',
+        verify=args.verify_yaml,
+    )
+    for generator in generators:
+        result = generator(args.workers, args.profile, cache, args.compat_entropy)
+        filename = os.path.join(args.output_dir, result['filename'])
+        if args.format == 'binary':
+            filename = os.path.splitext(filename)[0] + '.bin'
+        with open_output(
+                filename,
+                None if args.format == 'binary' else emitter,
+                args.chunk_size,
+                YAML_CONVERTERS,
+                compression=args.compress,
+                level=args.compress_level) as output:
             # Dump at top level
-            yaml.dump(result['metadata'], outfile, default_flow_style=False)
-            # default_flow_style will unravel "ValidatorRecord" and "committee" line, exploding file size
-            yaml.dump({'test_cases': result['test_cases']}, outfile)
+            output.dump(result['metadata'])
+            output.dump_sequence('test_cases', result['test_cases'])
+    if args.verify_yaml:
+        print(emitter.report())
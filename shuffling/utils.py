@@ -1,6 +1,92 @@
+from contextlib import contextmanager
+import time
+from typing import Iterator, List, Sequence
+
 from eth_typing import Hash32
 from eth_utils import keccak
 
 
+class HashProvider:
+    """
+    Computes the keccak256 hashes used by the shuffling.
+    Subclasses can override ``hash_many`` with a batched implementation.
+    """
+
+    def hash(self, x: bytes) -> Hash32:
+        return keccak(x)
+
+    def hash_many(self, xs: Sequence[bytes]) -> List[Hash32]:
+        return [self.hash(x) for x in xs]
+
+
+class HashStats:
+    """
+    Number of hashes, bytes hashed and time spent hashing
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.bytes_hashed = 0
+        self.seconds = 0.0
+
+    def __str__(self) -> str:
+        return f'{self.calls} hashes, {self.bytes_hashed} bytes hashed in {self.seconds:.3f}s'
+
+
+class CountingHashProvider(HashProvider):
+    """
+    Delegates to ``provider`` and records every call in ``stats``
+    """
+
+    def __init__(self, provider: HashProvider) -> None:
+        self.provider = provider
+        self.stats = HashStats()
+
+    def hash(self, x: bytes) -> Hash32:
+        start = time.perf_counter()
+        result = self.provider.hash(x)
+        self.stats.seconds += time.perf_counter() - start
+        self.stats.calls += 1
+        self.stats.bytes_hashed += len(x)
+        return result
+
+    def hash_many(self, xs: Sequence[bytes]) -> List[Hash32]:
+        start = time.perf_counter()
+        result = self.provider.hash_many(xs)
+        self.stats.seconds += time.perf_counter() - start
+        self.stats.calls += len(xs)
+        self.stats.bytes_hashed += sum(len(x) for x in xs)
+        return result
+
+
+hash_provider = HashProvider()
+
+
 def hash(x: bytes) -> Hash32:
-    return keccak(x)
+    return hash_provider.hash(x)
+
+
+def hash_many(xs: Sequence[bytes]) -> List[Hash32]:
+    return hash_provider.hash_many(xs)
+
+
+@contextmanager
+def use_hash_provider(provider: HashProvider) -> Iterator[HashProvider]:
+    """
+    Compute all hashes with ``provider`` within the context
+    """
+    global hash_provider
+    previous, hash_provider = hash_provider, provider
+    try:
+        yield provider
+    finally:
+        hash_provider = previous
+
+
+@contextmanager
+def hash_stats() -> Iterator[HashStats]:
+    """
+    Count the hashes computed within the context
+    """
+    with use_hash_provider(CountingHashProvider(hash_provider)) as provider:
+        yield provider.stats
@@ -1,7 +1,14 @@
-from typing import Any
+from array import array
+import json
+from typing import Any, Dict, Iterator, List
 
 import yaml
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class Validator(yaml.YAMLObject):
     """ 
@@ -18,8 +25,58 @@ class Validator(yaml.YAMLObject):
         for k in self.fields.keys():
             setattr(self, k, kwargs.get(k))
 
-    def __setattr__(self, name: str, value: Any) -> None:
-        super().__setattr__(name, value)
 
-    def __getattribute__(self, name: str) -> Any:
-        return super().__getattribute__(name)
+class ValidatorRegistry:
+    """
+    A struct-of-arrays registry of validator stubs, with one uint64 column per ``Validator`` field.
+    Dumps to the same YAML layout as a list of ``Validator``.
+    """
+    fields = Validator.fields
+
+    def __init__(self) -> None:
+        self.activation_epoch = array('Q')
+        self.exit_epoch = array('Q')
+        self.original_index = array('Q')
+
+    def __len__(self) -> int:
+        return len(self.original_index)
+
+    def __getitem__(self, index: int) -> Validator:
+        return Validator(**{field: getattr(self, field)[index] for field in self.fields})
+
+    def append(self, *, activation_epoch: int, exit_epoch: int, original_index: int) -> None:
+        self.activation_epoch.append(activation_epoch)
+        self.exit_epoch.append(exit_epoch)
+        self.original_index.append(original_index)
+
+    def get_active_validator_indices(self, epoch: int) -> List[int]:
+        """
+        Get indices of validators active at ``epoch``.
+        """
+        if np is not None:
+            activation_epoch = np.frombuffer(self.activation_epoch, dtype=np.uint64)
+            exit_epoch = np.frombuffer(self.exit_epoch, dtype=np.uint64)
+            epoch = np.uint64(epoch)
+            return np.flatnonzero((activation_epoch <= epoch) & (epoch < exit_epoch)).tolist()
+
+        return [
+            i for i, (activation, exit) in enumerate(zip(self.activation_epoch, self.exit_epoch))
+            if activation <= epoch < exit
+        ]
+
+    def to_mappings(self) -> Iterator[Dict[str, int]]:
+        """
+        Yield every validator as a ``Validator`` field mapping.
+        """
+        for values in zip(*(getattr(self, field) for field in self.fields)):
+            yield dict(zip(self.fields, values))
+
+    def to_json(self) -> str:
+        return json.dumps(list(self.to_mappings()))
+
+
+def represent_validator_registry(dumper: yaml.Dumper, registry: ValidatorRegistry) -> Any:
+    return dumper.represent_list(list(registry.to_mappings()))
+
+
+yaml.add_representer(ValidatorRegistry, represent_validator_registry)
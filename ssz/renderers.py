@@ -2,6 +2,12 @@ from collections.abc import (
     Mapping,
     Sequence,
 )
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    NamedTuple,
+)
 
 from eth_utils import (
     encode_hex,
@@ -69,6 +75,124 @@ def render_type_definition(sedes):
         raise TypeError("Expected BaseSedes")
 
 
+def get_sedes_key(sedes):
+    """
+    Return a hashable key of the structure of ``sedes``, which is the same for equivalent sedes
+    objects (sedes compare by identity).
+    """
+    if isinstance(sedes, Boolean):
+        return ("bool",)
+    elif isinstance(sedes, UInt):
+        return ("uint", sedes.length)
+    elif isinstance(sedes, BytesN):
+        return ("bytesN", sedes.length)
+    elif isinstance(sedes, Bytes):
+        return ("bytes",)
+    elif isinstance(sedes, List):
+        return ("list", get_sedes_key(sedes.element_sedes))
+    elif isinstance(sedes, Container):
+        return ("container", tuple(
+            (field_name, get_sedes_key(field_sedes))
+            for field_name, field_sedes in sedes.fields
+        ))
+    elif isinstance(sedes, BaseSedes):
+        raise Exception("Unreachable: All sedes types have been checked")
+    else:
+        raise TypeError("Expected BaseSedes")
+
+
+class CompiledRenderer(NamedTuple):
+    # Returns the type definition. Lists and dicts are built anew on every call, otherwise
+    # ruamel would use YAML references for the type definitions of successive test cases
+    type_definition: Callable[[], Any]
+    # Same as ``render_value`` for values of the sedes, without dispatching on their types
+    render_value: Callable[[Any], Any]
+
+
+def render_hex(value):
+    return '0x' + value.hex()
+
+
+def render_bool(value):
+    return value
+
+
+def compile_uncached_renderer(sedes):
+    if isinstance(sedes, (Boolean, UInt, BytesN, Bytes)):
+        type_definition = render_type_definition(sedes)
+        if isinstance(sedes, Boolean):
+            render = render_bool
+        elif isinstance(sedes, UInt):
+            render = str
+        else:
+            render = render_hex
+        return CompiledRenderer(lambda: type_definition, render)
+
+    elif isinstance(sedes, List):
+        element_type_definition, render_element = compile_renderer(sedes.element_sedes)
+        return CompiledRenderer(
+            lambda: [element_type_definition()],
+            lambda value: tuple(render_element(element) for element in value),
+        )
+
+    elif isinstance(sedes, Container):
+        field_renderers = {
+            field_name: compile_renderer(field_sedes)
+            for field_name, field_sedes in sedes.fields
+        }
+        field_type_definitions = tuple(
+            (field_name, renderer.type_definition)
+            for field_name, renderer in field_renderers.items()
+        )
+        render_fields = {
+            field_name: renderer.render_value
+            for field_name, renderer in field_renderers.items()
+        }
+
+        def render_container(value):
+            # values that are not mappings are rendered as ``render_value`` would
+            if not isinstance(value, Mapping):
+                return render_value(value)
+            # like ``render_dict_value``, keep the order of the fields in the value
+            rendered = {}
+            for field_name, element in value.items():
+                if field_name not in render_fields:
+                    raise ValueError(f"Cannot render value {value}: no field {field_name!r} in the container")
+                rendered[field_name] = render_fields[field_name](element)
+            return rendered
+
+        return CompiledRenderer(
+            lambda: {
+                field_name: type_definition()
+                for field_name, type_definition in field_type_definitions
+            },
+            render_container,
+        )
+
+    elif isinstance(sedes, BaseSedes):
+        raise Exception("Unreachable: All sedes types have been checked")
+
+    else:
+        raise TypeError("Expected BaseSedes")
+
+
+compiled_renderers: Dict[Any, CompiledRenderer] = {}
+
+
+def compile_renderer(sedes):
+    """
+    Return the renderer of the type definition and of the values of ``sedes``, compiled once
+    per sedes structure.
+    """
+    key = get_sedes_key(sedes)
+    try:
+        return compiled_renderers[key]
+    except KeyError:
+        renderer = compile_uncached_renderer(sedes)
+        compiled_renderers[key] = renderer
+        return renderer
+
+
 @to_dict
 def render_test_case(*, sedes, valid, value=None, serial=None, description=None, tags=None):
     value_and_serial_given = value is not None and serial is not None
@@ -82,10 +206,12 @@ def render_test_case(*, sedes, valid, value=None, serial=None, description=None,
     if tags is None:
         tags = []
 
-    yield "type", render_type_definition(sedes)
+    renderer = compile_renderer(sedes)
+    yield "type", renderer.type_definition()
     yield "valid", valid
     if value is not None:
-        yield "value", render_value(value)
+        # values of invalid test cases do not necessarily match the sedes
+        yield "value", renderer.render_value(value) if valid else render_value(value)
     if serial is not None:
         yield "ssz", encode_hex(serial)
     if description is not None:
@@ -1,23 +1,29 @@
 import argparse
+import functools
+import os
 import pathlib
 import sys
 
-from ruamel.yaml import (
-    YAML,
-)
+# Shared generator helpers live at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
 
-from uint_test_generators import (
+from gen_helpers.compression import (  # noqa: E402
+    COMPRESSIONS,
+)
+from gen_helpers.output import (  # noqa: E402
+    open_output,
+)
+from gen_helpers.yaml_emit import (  # noqa: E402
+    RuamelLibrary,
+    YAMLEmitter,
+)
+from uint_test_generators import (  # noqa: E402
+    RANDOM_TEST_CASES_PER_BIT_SIZE,
     generate_uint_bounds_test,
     generate_uint_random_test,
     generate_uint_wrong_length_test,
 )
 
-test_generators = [
-    generate_uint_random_test,
-    generate_uint_wrong_length_test,
-    generate_uint_bounds_test,
-]
-
 
 def make_filename_for_test(test):
     title = test["title"]
@@ -56,29 +62,106 @@ parser.add_argument(
     default=False,
     help="if set overwrite test files if they exist",
 )
+parser.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    default=None,
+    help="generate the test cases on this many processes, the output is the same for any "
+         "number of workers",
+)
+parser.add_argument(
+    "--compat-entropy",
+    action="store_true",
+    default=False,
+    help="draw random values one at a time from the global seeded stream (or from one seed per "
+         "bit size with --workers), reproducing the output of previous versions",
+)
+parser.add_argument(
+    "--random-cases",
+    type=int,
+    default=RANDOM_TEST_CASES_PER_BIT_SIZE,
+    help="number of random test cases per bit size (default: %(default)s)",
+)
+parser.add_argument(
+    "--format",
+    choices=["yaml", "binary"],
+    default="yaml",
+    help="write YAML files, or binary test vector containers (.bin) with an index of the test "
+         "cases (default: %(default)s)",
+)
+parser.add_argument(
+    "--chunk-size",
+    type=int,
+    default=None,
+    help="split the test cases into files of this many test cases, listed in a manifest",
+)
+parser.add_argument(
+    "--compress",
+    choices=COMPRESSIONS,
+    default=None,
+    help="compress the output files while they are written, and write the digest of every "
+         "compressed file to a .sha256 sidecar",
+)
+parser.add_argument(
+    "--compress-level",
+    type=int,
+    default=None,
+    help="compression level, 1-9 (0-9 for xz, default: the default level of the compression)",
+)
+parser.add_argument(
+    "--yaml-emitter",
+    choices=["fast", "library"],
+    default="fast",
+    help="write the test cases directly (fast), or always with the YAML library (default: "
+         "%(default)s)",
+)
+parser.add_argument(
+    "--verify-yaml",
+    action="store_true",
+    default=False,
+    help="check that the output loads as the same documents as the output of the pure Python "
+         "emitter",
+)
 
 
 if __name__ == "__main__":
     args = parser.parse_args()
     output_dir = args.output_dir
-    if not args.force:
-        file_mode = "x"
-    else:
-        file_mode = "w"
 
-    yaml = YAML(pure=True)
+    emitter = YAMLEmitter(RuamelLibrary(), fast=args.yaml_emitter == "fast", verify=args.verify_yaml)
+
+    test_generators = [
+        functools.partial(generate_uint_random_test, cases_per_bit_size=args.random_cases),
+        generate_uint_wrong_length_test,
+        generate_uint_bounds_test,
+    ]
 
     print(f"generating {len(test_generators)} test files...")
     for test_generator in test_generators:
-        test = test_generator()
+        test = test_generator(workers=args.workers, compat=args.compat_entropy)
+        # Test cases are generated lazily, while the previous ones are written
+        test_cases = test.pop("test_cases")
 
         filename = make_filename_for_test(test)
         path = output_dir / filename
 
+        if args.format == "binary":
+            path = path.with_suffix(".bin")
+
         try:
-            with path.open(file_mode) as f:
-                yaml.dump(test, f)
+            with open_output(
+                    str(path),
+                    None if args.format == "binary" else emitter,
+                    args.chunk_size,
+                    exclusive=not args.force,
+                    compression=args.compress,
+                    level=args.compress_level) as output:
+                output.dump(test)
+                output.dump_sequence("test_cases", test_cases)
         except IOError as e:
             sys.exit(f'Error when dumping test "{test["title"]}" ({e})')
 
+    if args.verify_yaml:
+        print(emitter.report())
     print("done.")
@@ -1,19 +1,33 @@
-import random
-
 from eth_utils import (
     to_tuple,
 )
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 import ssz
 from ssz.sedes import (
     UInt,
 )
+from gen_helpers.entropy import (
+    Entropy,
+    get_case_streams,
+)
+from gen_helpers.parallel import (
+    map_cases,
+)
 from renderers import (
+    compile_renderer,
     render_test,
     render_test_case,
 )
 
-random.seed(0)
+SEED = 0
+# In compatibility mode, both random generators draw from this stream in turn, as they did
+# from the global random module seeded on import
+legacy_random = Entropy(SEED, compat=True)
 
 
 BIT_SIZES = [i for i in range(8, 512 + 1, 8)]
@@ -21,11 +35,7 @@ RANDOM_TEST_CASES_PER_BIT_SIZE = 10
 RANDOM_TEST_CASES_PER_LENGTH = 3
 
 
-def get_random_bytes(length):
-    return bytes(random.randint(0, 255) for _ in range(length))
-
-
-def generate_uint_bounds_test():
+def generate_uint_bounds_test(workers=None, compat=False):
     test_cases = generate_uint_bounds_test_cases() + generate_uint_out_of_bounds_test_cases()
 
     return render_test(
@@ -36,8 +46,10 @@ def generate_uint_bounds_test():
     )
 
 
-def generate_uint_random_test():
-    test_cases = generate_random_uint_test_cases()
+def generate_uint_random_test(workers=None,
+                              compat=False,
+                              cases_per_bit_size=RANDOM_TEST_CASES_PER_BIT_SIZE):
+    test_cases = generate_random_uint_test_cases(workers, compat, cases_per_bit_size)
 
     return render_test(
         title="UInt Random",
@@ -47,8 +59,8 @@ def generate_uint_random_test():
     )
 
 
-def generate_uint_wrong_length_test():
-    test_cases = generate_uint_wrong_length_test_cases()
+def generate_uint_wrong_length_test(workers=None, compat=False):
+    test_cases = generate_uint_wrong_length_test_cases(workers, compat)
 
     return render_test(
         title="UInt Wrong Length",
@@ -58,46 +70,95 @@ def generate_uint_wrong_length_test():
     )
 
 
+def generate_per_bit_size(make_test_cases, name, workers=None, compat=False, extra_args=()):
+    """
+    Yield the test cases of ``make_test_cases(rng, bit_size, *extra_args)`` for all bit sizes,
+    generated on ``workers`` processes if set.
+
+    Every bit size draws from its own stream, see ``get_case_streams`` for ``compat``.
+    """
+    streams = get_case_streams(SEED, name, len(BIT_SIZES), workers, compat, legacy_random)
+    arguments = [(rng, bit_size) + tuple(extra_args) for rng, bit_size in zip(streams, BIT_SIZES)]
+    for test_cases in map_cases(make_test_cases, arguments, workers):
+        yield from test_cases
+
+
+def serialize_uints(values, bit_size):
+    """
+    Return the concatenated serializations of ``values`` as ``UInt(bit_size)``, the same as
+    ``b''.join(ssz.encode(value, UInt(bit_size)) for value in values)``
+    """
+    length = bit_size // 8
+    if np is not None and length <= 8:
+        # Little-endian uint64s, truncated to their first ``length`` bytes
+        return np.array(values, dtype='<u8').view(np.uint8).reshape(-1, 8)[:, :length].tobytes()
+    return b''.join(value.to_bytes(length, 'little') for value in values)
+
+
+def render_uint_test_cases(bit_size, valid, tags, values=None, serials=None):
+    """
+    Yield ``render_test_case(sedes=UInt(bit_size), ...)`` of every value and serial, with the
+    type definition rendered once
+    """
+    type_definition = compile_renderer(UInt(bit_size)).type_definition()
+    for index in range(len(values if values is not None else serials)):
+        test_case = {"type": type_definition, "valid": valid}
+        if values is not None:
+            test_case["value"] = str(values[index])
+        if serials is not None:
+            test_case["ssz"] = '0x' + serials[index].hex()
+        # note that we need to create the tags for each test case (``tags`` is a list, so that
+        # this makes a new tuple), otherwise ruamel will use YAML references which makes the
+        # resulting file harder to read
+        test_case["tags"] = tuple(tags)
+        yield test_case
+
+
+def generate_random_uint_test_cases(workers=None,
+                                    compat=False,
+                                    cases_per_bit_size=RANDOM_TEST_CASES_PER_BIT_SIZE):
+    yield from generate_per_bit_size(
+        make_random_uint_test_cases, "uint_random", workers, compat, (cases_per_bit_size,))
+
+
 @to_tuple
-def generate_random_uint_test_cases():
-    for bit_size in BIT_SIZES:
-        sedes = UInt(bit_size)
+def make_random_uint_test_cases(rng, bit_size, cases_per_bit_size=RANDOM_TEST_CASES_PER_BIT_SIZE):
+    values = rng.random_uints(cases_per_bit_size, bit_size)
+    serial = serialize_uints(values, bit_size)
+    length = bit_size // 8
+    yield from render_uint_test_cases(
+        bit_size,
+        valid=True,
+        tags=["atomic", "uint", "random"],
+        values=values,
+        serials=[serial[i:i + length] for i in range(0, len(serial), length)],
+    )
 
-        for _ in range(RANDOM_TEST_CASES_PER_BIT_SIZE):
-            value = random.randrange(0, 2 ** bit_size)
-            serial = ssz.encode(value, sedes)
-            # note that we need to create the tags in each loop cycle, otherwise ruamel will use
-            # YAML references which makes the resulting file harder to read
-            tags = tuple(["atomic", "uint", "random"])
-            yield render_test_case(
-                sedes=sedes,
-                valid=True,
-                value=value,
-                serial=serial,
-                tags=tags,
-            )
+
+def generate_uint_wrong_length_test_cases(workers=None, compat=False):
+    yield from generate_per_bit_size(make_uint_wrong_length_test_cases, "uint_wrong_length", workers, compat)
 
 
 @to_tuple
-def generate_uint_wrong_length_test_cases():
-    for bit_size in BIT_SIZES:
-        sedes = UInt(bit_size)
-        lengths = sorted({
-            0,
-            sedes.length // 2,
-            sedes.length - 1,
-            sedes.length + 1,
-            sedes.length * 2,
-        })
-        for length in lengths:
-            for _ in range(RANDOM_TEST_CASES_PER_LENGTH):
-                tags = tuple(["atomic", "uint", "wrong_length"])
-                yield render_test_case(
-                    sedes=sedes,
-                    valid=False,
-                    serial=get_random_bytes(length),
-                    tags=tags,
-                )
+def make_uint_wrong_length_test_cases(rng, bit_size):
+    sedes = UInt(bit_size)
+    lengths = sorted({
+        0,
+        sedes.length // 2,
+        sedes.length - 1,
+        sedes.length + 1,
+        sedes.length * 2,
+    })
+    yield from render_uint_test_cases(
+        bit_size,
+        valid=False,
+        tags=["atomic", "uint", "wrong_length"],
+        serials=[
+            rng.random_bytes(length)
+            for length in lengths
+            for _ in range(RANDOM_TEST_CASES_PER_LENGTH)
+        ],
+    )
 
 
 @to_tuple